@@ -3,27 +3,607 @@ FLASK WEB INTERFACE - iPad-Friendly Trading Dashboard
 3-Button System: UPDATE | ANALYZE | RESULTS
 """
 
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, Response, g, jsonify, request, render_template_string, stream_with_context
 from flask_cors import CORS
+import gzip
+import hashlib
+import heapq
 import json
 import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime
-from trading_system import LiveTradingAnalyzer, load_config, save_config, SECTORS
+from trading_system import (
+    LiveTradingAnalyzer, ResultsStore, SamplingProfiler, WarmupScheduler, load_config, save_config,
+    metrics, SECTORS
+)
+
+try:
+    import brotli  # Optional: smaller payloads for browsers that accept br
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
 
-# Global analyzer
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None and request.endpoint:
+        metrics.observe('http_request_seconds', time.perf_counter() - start, endpoint=request.endpoint)
+    return response
+
+# Global analyzer (created on first use in each worker process)
 analyzer = None
-latest_results = None
+analyzer_lock = threading.Lock()
+
+# Results live in a shared store so every worker (and a restarted one) sees
+# the latest run; each worker keeps an index over the run it last loaded
+results_store = ResultsStore(load_config().get('results_store_file', 'results.db'))
+latest_index = None
+index_lock = threading.Lock()
 analysis_progress = {'message': '', 'type': 'info'}
 
-def log_progress(message, log_type='info'):
+# Each open progress stream holds a server thread until it ends; keep
+# some threads free for ordinary requests (see max_streams and the Procfile)
+stream_slots = threading.BoundedSemaphore(max(1, int(load_config().get('max_streams', 8))))
+
+# ============================================================================
+# PROGRESS EVENTS (Ring buffer behind the SSE stream)
+# ============================================================================
+
+class ProgressEventBuffer:
+    """Bounded, numbered log of progress events shared by every viewer
+    
+    The analysis thread only appends; each SSE client keeps its own cursor
+    (the last event ID it saw) and waits on a condition for newer events.
+    """
+    
+    def __init__(self, size=1000):
+        self._events = deque(maxlen=size)
+        self._next_id = 1
+        self._cond = threading.Condition()
+    
+    def publish(self, message, log_type='info', **extra):
+        with self._cond:
+            event = {
+                'id': self._next_id,
+                'time': datetime.now().isoformat(),
+                'message': message,
+                'type': log_type,
+                **extra
+            }
+            self._next_id += 1
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+    
+    def since(self, last_id):
+        """Events newer than last_id still in the buffer"""
+        with self._cond:
+            return [e for e in self._events if e['id'] > last_id]
+    
+    def wait(self, last_id, timeout):
+        """Block until there is an event newer than last_id (or timeout)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._next_id - 1 > last_id, timeout=timeout)
+            return [e for e in self._events if e['id'] > last_id]
+    
+    @property
+    def last_id(self):
+        with self._cond:
+            return self._next_id - 1
+
+
+progress_events = ProgressEventBuffer()
+
+def log_progress(message, log_type='info', **extra):
     """Log progress message for live viewer"""
     global analysis_progress
     analysis_progress = {'message': message, 'type': log_type}
+    progress_events.publish(message, log_type, **extra)
     print(f"[{log_type.upper()}] {message}")  # Also print to terminal
 
+def publish_run_event(event):
+    """Turn a run_analysis progress event into a log line with its timing"""
+    event = {k: v for k, v in event.items() if k != 'rows'}  # Rows stay in the job
+    stage = event.pop('type')
+    
+    if stage == 'regime':
+        message = f"📊 Market regime: {event['market_regime']['regime'].upper()} ({event['elapsed_ms']:.0f} ms)"
+    elif stage == 'sector_scored':
+        timing = event['timing']
+        message = (f"📁 {event['sector']}: {event['scored']}/{event['total']} scored "
+                   f"(download {timing['download_ms']:.0f} ms, scoring {timing['score_ms']:.0f} ms)")
+    elif stage == 'enriching':
+        message = f"🔬 Enriching top {event['count']} stocks..."
+    elif stage == 'symbol_enriched':
+        message = f"   {event['symbol']} enriched in {event['elapsed_ms']:.0f} ms"
+    elif stage == 'complete':
+        message = f"🏁 Run finished in {event['timing']['total_ms'] / 1000:.1f}s"
+        if event.get('partial'):
+            coverage = event['coverage']
+            message += (f" (time budget reached: {coverage['symbols_scored']}/{coverage['symbols_total']}"
+                        f" scored, {coverage['enriched']}/{coverage['finalists']} enriched)")
+    else:
+        message = stage
+    
+    log_progress(message, 'info', stage=stage, **event)
+
+# ============================================================================
+# RESULTS INDEX (O(1) symbol lookups and cached recommendations)
+# ============================================================================
+
+class ResultsIndex:
+    """Symbol lookups over one set of results, built once per run
+    
+    Recommendations for the top opportunities are formatted up front and
+    kept until a position-sizing setting changes. Details rebuilt for
+    stocks outside the top are kept in a small LRU.
+    """
+    
+    SIZING_KEYS = ('capital', 'position_size_pct', 'stop_loss_pct', 'take_profit_pct')
+    MAX_DETAILS = 64
+    MAX_RESPONSES = 32
+    
+    def __init__(self, run_id, version, results):
+        self.run_id = run_id
+        self.version = version
+        self.results = results
+        self.positions = {row['symbol']: i for i, row in enumerate(results['all_stocks'])}
+        self.top = {stock['symbol']: stock for stock in results['top_opportunities']}
+        self._responses = OrderedDict()  # (query, encoding) -> encoded body
+        self._details = OrderedDict()
+        self._recommendations = {}
+        self._sizing = None
+        self._lock = threading.Lock()
+    
+    def __contains__(self, symbol):
+        return symbol in self.positions or symbol in self.top
+    
+    def row(self, symbol):
+        """Compact all_stocks row for symbol (or None)"""
+        i = self.positions.get(symbol)
+        return None if i is None else self.results['all_stocks'][i]
+    
+    @classmethod
+    def sizing_key(cls, config):
+        return tuple(config.get(key) for key in cls.SIZING_KEYS)
+    
+    def analysis(self, symbol, analyzer):
+        """Full analysis for symbol, rebuilding (and caching) it if needed"""
+        if symbol in self.top:
+            return self.top[symbol]
+        
+        with self._lock:
+            if symbol in self._details:
+                self._details.move_to_end(symbol)
+                return self._details[symbol]
+        
+        stock = analyzer.analyze_stock(symbol, self.results['market_regime'])
+        if stock is not None:
+            with self._lock:
+                self._details[symbol] = stock
+                while len(self._details) > self.MAX_DETAILS:
+                    self._details.popitem(last=False)
+        return stock
+    
+    def precompute(self, analyzer):
+        """Format every top opportunity for the analyzer's current sizing"""
+        with self._lock:
+            self._refresh_sizing(analyzer)
+            for symbol, stock in self.top.items():
+                if symbol not in self._recommendations:
+                    self._recommendations[symbol] = self._format(analyzer, stock)
+    
+    def recommendation(self, symbol, analyzer):
+        """Cached format_recommendation output, or None if unavailable
+        
+        Raises KeyError when symbol is not part of these results.
+        """
+        if symbol not in self:
+            raise KeyError(symbol)
+        
+        with self._lock:
+            self._refresh_sizing(analyzer)
+            if symbol in self._recommendations:
+                return self._recommendations[symbol]
+        
+        stock = self.analysis(symbol, analyzer)
+        if stock is None:
+            return None
+        
+        recommendation = self._format(analyzer, stock)
+        with self._lock:
+            self._recommendations[symbol] = recommendation
+        return recommendation
+    
+    def _refresh_sizing(self, analyzer):
+        # Caller holds self._lock
+        sizing = self.sizing_key(analyzer.config)
+        if sizing != self._sizing:
+            self._recommendations.clear()
+            self._sizing = sizing
+    
+    @staticmethod
+    def _format(analyzer, stock):
+        return analyzer.format_recommendation(stock, analyzer.config.get('capital', 2400))
+    
+    def etag(self, query):
+        return hashlib.sha1(f'{self.version}|{query}'.encode()).hexdigest()[:20]
+    
+    def encoded_response(self, query, encoding, build):
+        """Encoded body for a query, calling build() only on a cache miss"""
+        key = (query, encoding)
+        with self._lock:
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key]
+        
+        body = encode_body(app.json.dumps(build()).encode(), encoding)
+        with self._lock:
+            self._responses[key] = body
+            while len(self._responses) > self.MAX_RESPONSES:
+                self._responses.popitem(last=False)
+        return body
+
+
+# ============================================================================
+# RESULTS QUERIES (/api/results pagination, projection and compression)
+# ============================================================================
+
+MAX_PAGE_SIZE = 500
+QUERY_PARAMS = {'view', 'page', 'per_page', 'sort', 'fields', 'symbols', 'sector'}
+
+def field_value(row, field):
+    """Look up a possibly dotted field ('factors.momentum.1m') in a row"""
+    value = row
+    for part in field.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def query_results(results, args):
+    """Filter, sort, paginate and project one list of results
+    
+    view=all (compact rows, default) or top (full detail);
+    min_<field>/max_<field>, symbols=A,B and sector=<SECTORS key> filter;
+    sort=-score,rsi sorts (leading '-' is descending, missing values last);
+    fields=symbol,score,factors.rsi projects; page/per_page paginate.
+    Raises ValueError on malformed parameters.
+    """
+    view = args.get('view', 'all')
+    if view not in ('all', 'top'):
+        raise ValueError("view must be 'all' or 'top'")
+    rows = results['all_stocks'] if view == 'all' else results['top_opportunities']
+    
+    if args.get('symbols'):
+        wanted = {s.strip().upper() for s in args['symbols'].split(',')}
+        rows = [r for r in rows if r['symbol'] in wanted]
+    if args.get('sector'):
+        # The universe sector is on the compact rows; full analyses carry
+        # Yahoo's own sector name, so match them by symbol
+        in_sector = {r['symbol'] for r in results['all_stocks'] if r.get('sector') == args['sector']}
+        rows = [r for r in rows if r['symbol'] in in_sector]
+    
+    for name, raw in args.items():
+        if not name.startswith(('min_', 'max_')):
+            continue
+        field, bound = name[4:], float(raw)
+        if name.startswith('min_'):
+            keep = lambda v: v is not None and v >= bound
+        else:
+            keep = lambda v: v is not None and v <= bound
+        try:
+            rows = [r for r in rows if keep(field_value(r, field))]
+        except TypeError:
+            raise ValueError(f"can't filter by {field}: not a numeric field")
+    
+    if args.get('sort'):
+        rows = list(rows)
+        for key in reversed(args['sort'].split(',')):
+            field, descending = key.lstrip('-'), key.startswith('-')
+            present = [r for r in rows if field_value(r, field) is not None]
+            missing = [r for r in rows if field_value(r, field) is None]
+            try:
+                present.sort(key=lambda r: field_value(r, field), reverse=descending)
+            except TypeError:
+                raise ValueError(f"can't sort by {field}: not a number or string field")
+            rows = present + missing
+    
+    per_page = min(int(args.get('per_page', 50)), MAX_PAGE_SIZE)
+    page = int(args.get('page', 1))
+    if per_page < 1 or page < 1:
+        raise ValueError('page and per_page must be positive')
+    total = len(rows)
+    rows = rows[(page - 1) * per_page:page * per_page]
+    
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+        rows = [{field: field_value(r, field) for field in fields} for r in rows]
+    
+    return {
+        'market_regime': results['market_regime'],
+        'timestamp': results['timestamp'],
+        'total_analyzed': results['total_analyzed'],
+        'view': view,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+        'stocks': rows
+    }
+
+def negotiate_encoding():
+    accepted = request.headers.get('Accept-Encoding', '').lower()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def encode_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+def get_analyzer():
+    global analyzer
+    with analyzer_lock:
+        if analyzer is None:
+            analyzer = LiveTradingAnalyzer(load_config())
+        return analyzer
+
+def current_index():
+    """Index over the newest stored run, reloaded only when a new run lands"""
+    global latest_index
+    run_id = results_store.latest_id()
+    if run_id is None:
+        return None
+    
+    index = latest_index
+    if index is not None and index.run_id == run_id:
+        return index
+    
+    with index_lock:
+        if latest_index is None or latest_index.run_id != run_id:
+            loaded = results_store.load(run_id)
+            if loaded is None:  # Pruned by a newer run in between
+                loaded = results_store.load()
+            index = ResultsIndex(*loaded)
+            index.precompute(get_analyzer())
+            latest_index = index
+        return latest_index
+
+# ============================================================================
+# BACKGROUND ANALYSIS JOBS
+# ============================================================================
+
+class AnalysisJob:
+    """One queued run of LiveTradingAnalyzer.run_analysis"""
+    
+    def __init__(self, key, params, warmup=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.params = params
+        self.warmup = warmup  # Scheduled run: also pre-load company info for every stock
+        self.status = 'queued'
+        self.submitted_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {'scored': 0, 'total': 0, 'stage': 'queued'}
+        self.market_regime = None
+        self.rows = []  # Summary rows of every stock scored so far
+        self.results = None
+        self.error = None
+        self.profile = None  # SamplingProfiler of the run when params['profile'] is set
+        self.lock = threading.Condition()  # Notified on every change
+    
+    def on_progress(self, event):
+        """run_analysis progress_callback: record partial state"""
+        with self.lock:
+            self.progress['stage'] = event['type']
+            if event['type'] == 'regime':
+                self.market_regime = event['market_regime']
+            elif event['type'] == 'sector_scored':
+                self.rows.extend(event['rows'])
+                self.progress['scored'] = event['scored']
+                self.progress['total'] = event['total']
+            self.lock.notify_all()
+    
+    def finish(self, status, results=None, error=None):
+        with self.lock:
+            self.results = results
+            self.error = error
+            self.status = status
+            self.finished_at = datetime.now().isoformat()
+            self.lock.notify_all()
+    
+    def stream(self, heartbeat=15):
+        """Yield NDJSON-ready dicts: each scored stock, the provisional top-N
+        after every batch, and finally the authoritative results"""
+        sent_rows = 0
+        sent_regime = False
+        top_n = self.params['top_n']
+        
+        while True:
+            with self.lock:
+                self.lock.wait_for(
+                    lambda: len(self.rows) > sent_rows or self.status in ('done', 'error')
+                    or (self.market_regime is not None and not sent_regime),
+                    timeout=heartbeat
+                )
+                regime = self.market_regime
+                new_rows = self.rows[sent_rows:]
+                rows = list(self.rows)
+                status = self.status
+                progress = dict(self.progress)
+            
+            if regime is not None and not sent_regime:
+                sent_regime = True
+                yield {'type': 'regime', 'market_regime': regime}
+            
+            for row in new_rows:
+                yield {'type': 'scored', 'stock': row}
+            if new_rows:
+                sent_rows += len(new_rows)
+                yield {
+                    'type': 'provisional_top',
+                    'scored': len(rows),
+                    'progress': progress,
+                    'top': heapq.nlargest(top_n, rows, key=lambda r: r['score'])
+                }
+            
+            if status == 'done':
+                yield {'type': 'final', 'results': self.results}
+                return
+            if status == 'error':
+                yield {'type': 'error', **self.error}
+                return
+            if not new_rows:
+                yield {'type': 'heartbeat', 'status': status, 'progress': progress}
+    
+    def status_dict(self):
+        with self.lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'params': self.params,
+                'warmup': self.warmup,
+                'progress': dict(self.progress),
+                'submitted_at': self.submitted_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'error': self.error,
+                'profile': f'/api/jobs/{self.id}/profile' if self.params.get('profile') else None
+            }
+    
+    def partial_results(self):
+        """Provisional ranking of everything scored so far"""
+        with self.lock:
+            rows = sorted(self.rows, key=lambda r: r['score'], reverse=True)
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'partial': True,
+                'market_regime': self.market_regime,
+                'scored': len(rows),
+                'provisional_top': rows[:self.params['top_n']],
+                'progress': dict(self.progress)
+            }
+
+
+class AnalysisJobQueue:
+    """Run analyses one at a time on a worker thread
+    
+    Submitting the same parameters while a matching job is queued or
+    running returns that job instead of starting a second scan.
+    """
+    
+    MAX_FINISHED_JOBS = 20
+    
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._active = {}  # key -> job still queued or running
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+    
+    @staticmethod
+    def job_key(params):
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    
+    def submit(self, params, warmup=False):
+        """Return (job, coalesced)"""
+        key = self.job_key(params)
+        with self._lock:
+            if key in self._active:
+                return self._active[key], True
+            
+            job = AnalysisJob(key, params, warmup=warmup)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._trim()
+            
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_forever, daemon=True)
+                self._worker.start()
+        
+        self._queue.put(job)
+        return job, False
+    
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.status in ('done', 'error')]
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+    
+    def _run_forever(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._active.pop(job.key, None)
+    
+    def _run(self, job):
+        with job.lock:
+            job.status = 'running'
+            job.started_at = datetime.now().isoformat()
+        
+        try:
+            log_progress('Initializing analyzer...', 'info')
+            analyzer = get_analyzer()
+            
+            log_progress(f"Analyzing {len(job.params['enabled_sectors'])} sectors...", 'info')
+            callback = lambda event: (job.on_progress(event), publish_run_event(event))
+            profiler = SamplingProfiler().start() if job.params.get('profile') else None
+            try:
+                if job.warmup:
+                    results = analyzer.warmup(job.params['enabled_sectors'], job.params['top_n'], callback)
+                else:
+                    results = analyzer.run_analysis(
+                        enabled_sectors=job.params['enabled_sectors'],
+                        top_n=job.params['top_n'],
+                        progress_callback=callback,
+                        time_budget=job.params['time_budget']
+                    )
+            finally:
+                if profiler is not None:
+                    job.profile = profiler.stop()
+            
+            current_index()  # run_analysis stored the run; index it before reporting done
+            job.finish('done', results=results)
+            log_progress(f'✅ Complete! Analyzed {results["total_analyzed"]} stocks', 'success',
+                         stage='done', job_id=job.id)
+        except Exception as e:
+            job.finish('error', error={
+                'error': str(e),
+                'type': type(e).__name__,
+                'traceback': traceback.format_exc()
+            })
+            log_progress(f'❌ Error: {str(e)}', 'error', stage='done', job_id=job.id)
+            print("\n❌ ERROR DURING ANALYSIS:")
+            print(job.error['traceback'])
+
+
+job_queue = AnalysisJobQueue()
+
 # ============================================================================
 # HTML TEMPLATE (iPad Optimized)
 # ============================================================================
@@ -615,7 +1195,9 @@ HTML_TEMPLATE = """
     <script>
         let currentConfig = {};
         let currentResults = null;
-        let logPollingInterval = null;
+        let progressSource = null;
+        let progressTimer = null;
+        let lastProgressId = 0;
         
         // Log viewer functions
         function toggleLogs() {
@@ -655,27 +1237,51 @@ HTML_TEMPLATE = """
             document.getElementById('log-content').innerHTML = '';
         }
         
+        function showProgress(progress) {
+            lastProgressId = Math.max(lastProgressId, progress.id || 0);
+            if (progress.message) {
+                addLog(progress.message, progress.type || 'info');
+            }
+            if (progress.stage === 'done') {
+                stopLogPolling();
+            }
+        }
+        
         function startLogPolling() {
-            // Poll for progress updates every 2 seconds during analysis
-            logPollingInterval = setInterval(async () => {
-                try {
-                    const response = await fetch('/api/analysis-progress');
-                    if (response.ok) {
-                        const progress = await response.json();
-                        if (progress.message) {
-                            addLog(progress.message, progress.type || 'info');
-                        }
-                    }
-                } catch (error) {
-                    // Silent fail - progress endpoint may not return anything
+            // Server pushes every progress event; EventSource resumes after drops
+            stopLogPolling();
+            progressSource = new EventSource('/api/analysis-stream');
+            progressSource.addEventListener('progress', (e) => showProgress(JSON.parse(e.data)));
+            progressSource.addEventListener('error', () => {
+                // Closed for good (e.g. 503 when the server has too many streams): poll
+                if (progressSource && progressSource.readyState === EventSource.CLOSED) {
+                    progressSource = null;
+                    progressTimer = setInterval(pollProgress, 2000);
                 }
-            }, 2000);
+            });
+        }
+        
+        async function pollProgress() {
+            try {
+                // First poll: start from the newest event, like the stream does
+                const since = lastProgressId || Number.MAX_SAFE_INTEGER;
+                const response = await fetch('/api/analysis-progress?since=' + since);
+                const data = await response.json();
+                data.events.forEach(showProgress);
+                lastProgressId = lastProgressId || data.last_id;
+            } catch (error) {
+                console.error('Error polling progress:', error);
+            }
         }
         
         function stopLogPolling() {
-            if (logPollingInterval) {
-                clearInterval(logPollingInterval);
-                logPollingInterval = null;
+            if (progressSource) {
+                progressSource.close();
+                progressSource = null;
+            }
+            if (progressTimer) {
+                clearInterval(progressTimer);
+                progressTimer = null;
             }
         }
         
@@ -741,7 +1347,7 @@ HTML_TEMPLATE = """
                 });
                 
                 if (response.ok) {
-                    currentConfig = newConfig;
+                    currentConfig = (await response.json()).config;  // Merged with the saved settings
                     document.getElementById('capital-display').textContent = 
                         '$' + newConfig.capital.toLocaleString();
                     alert('✅ Settings saved successfully!');
@@ -790,10 +1396,14 @@ HTML_TEMPLATE = """
             try {
                 addLog('📡 Connecting to analysis engine...', 'info');
                 
-                const response = await fetch('/api/analyze', {
+                const submitted = await fetch('/api/analyze', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' }
                 });
+                const job = await submitted.json();
+                addLog(job.coalesced ? '🔗 Joined analysis already in progress' : `🧾 Job ${job.job_id} queued`, 'info');
+                
+                const response = await waitForJob(job.job_id);
                 
                 if (!response.ok) {
                     const errorData = await response.json();
@@ -838,6 +1448,21 @@ HTML_TEMPLATE = """
             }
         }
         
+        // Poll a background job until it finishes, then fetch its results
+        async function waitForJob(jobId) {
+            while (true) {
+                await new Promise(resolve => setTimeout(resolve, 2000));
+                const statusResponse = await fetch(`/api/jobs/${jobId}`);
+                if (!statusResponse.ok) {
+                    return statusResponse;
+                }
+                const status = await statusResponse.json();
+                if (status.status === 'done' || status.status === 'error') {
+                    return await fetch(`/api/jobs/${jobId}/results`);
+                }
+            }
+        }
+        
         function showResults() {
             if (!currentResults) {
                 alert('⚠️ Please run ANALYZE first!');
@@ -1090,91 +1715,357 @@ def get_config():
 
 @app.route('/api/config', methods=['POST'])
 def update_config():
-    """Update configuration"""
-    config = request.json
+    """Update configuration
+    
+    The body may hold only the settings being changed (the dashboard posts
+    just its form fields); it is merged over the saved config.
+    """
+    global results_store, latest_index
+    changes = request.get_json(silent=True)
+    if not isinstance(changes, dict):
+        return jsonify({'error': 'Expected a JSON object of settings'}), 400
+    
+    current = get_analyzer()
+    config = {**load_config(), **changes}
     save_config(config)
     
-    # Reload analyzer with new config
-    global analyzer
-    analyzer = LiveTradingAnalyzer(config)
+    # Rebuild only the stages whose settings changed; prices, scores and
+    # enrichment stay cached when e.g. only capital or stop loss moved
+    stages = current.update_config(config)
+    
+    # Serve results from the new store if it moved
+    if current.results_store.path != results_store.path:
+        with index_lock:
+            results_store = current.results_store
+            latest_index = None
+    
+    # Re-format the top opportunities now if position sizing changed
+    if 'sizing' in stages:
+        index = current_index()
+        if index is not None:
+            index.precompute(current)
+    
+    return jsonify({'status': 'success', 'config': config, 'invalidated': sorted(stages)})
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latencies, error counts and cache hit rates (Prometheus text format)
     
-    return jsonify({'status': 'success', 'config': config})
+    Metrics are per process: with several gunicorn workers each one
+    reports its own.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/analysis-progress', methods=['GET'])
 def get_progress():
-    """Get current analysis progress"""
+    """Get current analysis progress (or every buffered event after ?since=<id>)"""
+    since = request.args.get('since', type=int)
+    if since is not None:
+        return jsonify({'events': progress_events.since(since), 'last_id': progress_events.last_id})
     return jsonify(analysis_progress)
 
+@app.route('/api/analysis-stream', methods=['GET'])
+def stream_progress():
+    """Server-Sent Events feed of progress events
+    
+    Resumes after the standard Last-Event-ID header (or ?last_id=) and ends
+    once the run being watched finishes, so the connection frees its thread.
+    Answers 503 when max_streams streams are already open; clients then
+    poll /api/analysis-progress?since=<id> instead.
+    """
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_id', default=progress_events.last_id, type=int)
+    
+    def generate(last_id):
+        yield 'retry: 2000\n\n'
+        deadline = time.monotonic() + 900  # Hard cap on one connection
+        while time.monotonic() < deadline:
+            events = progress_events.wait(last_id, timeout=15)
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            for event in events:
+                last_id = event['id']
+                yield f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event, default=str)}\n\n"
+                if event.get('stage') == 'done':
+                    return
+    
+    return limited_stream(generate(last_id), 'text/event-stream')
+
+def limited_stream(body, mimetype):
+    """Streaming response that holds one of the max_streams slots until closed"""
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many open streams, poll instead'}), 503, {'Retry-After': '5'}
+    
+    try:
+        response = Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception:
+        stream_slots.release()
+        raise
+    response.call_on_close(stream_slots.release)
+    return response
+
+def submit_analysis(warmup=False, time_budget=None, profile=False):
+    """Queue (or join) a run for the current config: returns (job, coalesced)
+    
+    `time_budget` (seconds) overrides analysis_time_budget_s; 0 means none.
+    `profile` samples the run (see /api/jobs/<id>/profile); a profiled
+    request never joins an unprofiled run or vice versa.
+    """
+    config = analyzer.config if analyzer is not None else load_config()
+    if time_budget is None:
+        time_budget = config.get('analysis_time_budget_s', 0)
+    params = {
+        'enabled_sectors': list(config.get('enabled_sectors', [])),
+        'top_n': config.get('top_opportunities', 20),
+        'time_budget': float(time_budget) or None,
+        'profile': bool(profile)
+    }
+    return job_queue.submit(params, warmup=warmup)
+
+def scheduled_warmup():
+    """Scheduler callback: queue a warmup job and wait until it finishes"""
+    log_progress('⏰ Scheduled warmup starting', 'info')
+    job, _ = submit_analysis(warmup=True)
+    with job.lock:
+        job.lock.wait_for(lambda: job.status in ('done', 'error'))
+
+def start_warmup_scheduler():
+    """Run scheduled warmups in this process if warmup_schedule is set
+    
+    Under gunicorn every worker imports this module; a lock file next to
+    the results store lets only one of them schedule.
+    """
+    config = load_config()
+    if not config.get('warmup_schedule'):
+        return None
+    
+    scheduler = WarmupScheduler(
+        config['warmup_schedule'],
+        scheduled_warmup,
+        timezone=config.get('warmup_timezone'),
+        lock_path=results_store.path + '.scheduler.lock'
+    )
+    if not scheduler.start():
+        return None
+    print(f"⏰ Warmup scheduled: {config['warmup_schedule']} ({config.get('warmup_timezone') or 'local time'})")
+    return scheduler
+
+def ndjson_response(job):
+    """Stream a job's results as newline-delimited JSON"""
+    def generate():
+        for message in job.stream():
+            yield json.dumps({'job_id': job.id, **message}, default=str) + '\n'
+    
+    return limited_stream(generate(), 'application/x-ndjson')
+
+def requested_profile():
+    """profile=true in the query string or {"profile": true} in the body"""
+    if request.args.get('profile', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return (request.get_json(silent=True) or {}).get('profile') is True
+
+def requested_time_budget():
+    """Optional {"time_budget": seconds} in the request body (ValueError if malformed)"""
+    budget = (request.get_json(silent=True) or {}).get('time_budget')
+    if budget is None:
+        return None
+    budget = float(budget)
+    if budget < 0:
+        raise ValueError('time_budget must not be negative')
+    return budget
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
-    """Run the analysis"""
-    global analyzer, latest_results
+    """Queue an analysis run and return its job ID immediately
     
+    Optional JSON body {"time_budget": seconds} returns a (possibly
+    partial) ranking within that time; see run_analysis. profile=true
+    (query string or body) samples the run for /api/jobs/<id>/profile.
+    """
     try:
-        log_progress('Initializing analyzer...', 'info')
-        
-        if analyzer is None:
-            config = load_config()
-            analyzer = LiveTradingAnalyzer(config)
-        
-        # For Render free tier: limit to prevent timeout
-        enabled_sectors = analyzer.config.get('enabled_sectors', [])
-        
-        log_progress(f'Sectors selected: {len(enabled_sectors)}', 'info')
-        
-        # Auto-limit on Render to prevent timeout
-        if len(enabled_sectors) > 3:
-            log_progress('⚠️ Limiting to first 3 sectors (free tier)', 'warning')
-            enabled_sectors = enabled_sectors[:3]
-        
-        log_progress(f'Analyzing {len(enabled_sectors)} sectors...', 'info')
-        
-        # Run analysis
-        results = analyzer.run_analysis(
-            enabled_sectors=enabled_sectors,
-            top_n=analyzer.config.get('top_opportunities', 20)
-        )
-        
-        latest_results = results
-        log_progress(f'✅ Complete! Analyzed {results["total_analyzed"]} stocks', 'success')
-        return jsonify(results)
-    except Exception as e:
-        import traceback
-        error_details = {
-            'error': str(e),
-            'type': type(e).__name__,
-            'traceback': traceback.format_exc()
-        }
-        log_progress(f'❌ Error: {str(e)}', 'error')
-        print("\n❌ ERROR DURING ANALYSIS:")
-        print(error_details['traceback'])
-        return jsonify(error_details), 500
+        job, coalesced = submit_analysis(time_budget=requested_time_budget(), profile=requested_profile())
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Bad time_budget: {e}'}), 400
+    if coalesced:
+        log_progress('Analysis already in progress, joining it', 'info')
+    else:
+        log_progress(f"Sectors selected: {len(job.params['enabled_sectors'])}", 'info')
+    
+    response = job.status_dict()
+    response['coalesced'] = coalesced
+    return jsonify(response), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status and progress of an analysis job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.status_dict())
+
+@app.route('/api/jobs/<job_id>/partial', methods=['GET'])
+def get_job_partial(job_id):
+    """Get the provisional ranking of everything scored so far"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.partial_results())
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Queue (or join) a run and stream its results as they are scored"""
+    try:
+        job, _ = submit_analysis(time_budget=requested_time_budget(), profile=requested_profile())
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Bad time_budget: {e}'}), 400
+    return ndjson_response(job)
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """Stream a job's scored stocks, provisional top-N and final results (NDJSON)"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return ndjson_response(job)
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """Get the final results of a finished job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == 'error':
+        return jsonify(job.error), 500
+    if job.status != 'done':
+        return jsonify(job.status_dict()), 202
+    return jsonify(job.results)
+
+@app.route('/api/jobs/<job_id>/profile', methods=['GET'])
+def get_job_profile(job_id):
+    """Download a profiled job's samples
+    
+    ?format=json (default) is the per-stage and top-function summary;
+    collapsed is flamegraph.pl/speedscope input; pstats loads in
+    pstats.Stats or snakeviz.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job.params.get('profile'):
+        return jsonify({'error': 'Job was not profiled; submit it with profile=true'}), 404
+    if job.profile is None:
+        return jsonify(job.status_dict()), 202
+    
+    fmt = request.args.get('format', 'json')
+    if fmt == 'json':
+        return jsonify(job.profile.summary(top=request.args.get('top', 30, type=int)))
+    if fmt == 'collapsed':
+        body, mimetype = job.profile.collapsed(), 'text/plain; charset=utf-8'
+    elif fmt == 'pstats':
+        body, mimetype = job.profile.pstats_data(), 'application/octet-stream'
+    else:
+        return jsonify({'error': 'format must be json, collapsed or pstats'}), 400
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=profile_{job.id}.{fmt}'
+    })
 
 @app.route('/api/results', methods=['GET'])
 def get_results():
-    """Get latest results"""
-    if latest_results is None:
+    """Get latest results
+    
+    Without query parameters this is the full results object. Any of
+    view/page/per_page/sort/fields/symbols/sector/min_*/max_* switches
+    to a paginated list (see query_results). Responses are compressed
+    when the client accepts it and carry an ETag for If-None-Match.
+    """
+    index = current_index()
+    if index is None:
         return jsonify({'error': 'No results available. Run analysis first.'}), 404
     
-    return jsonify(latest_results)
+    args = request.args.to_dict()
+    paged = any(k in QUERY_PARAMS or k.startswith(('min_', 'max_')) for k in args)
+    query = json.dumps(args, sort_keys=True) if paged else ''
+    
+    etag = index.etag(query)
+    encoding = negotiate_encoding()
+    headers = {'ETag': f'W/"{etag}"', 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    
+    build = (lambda: query_results(index.results, args)) if paged else (lambda: index.results)
+    try:
+        body = index.encoded_response(query, encoding, build)
+    except ValueError as e:
+        return jsonify({'error': f'Bad query: {e}'}), 400
+    
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='application/json', headers=headers)
 
 @app.route('/api/recommendation/<symbol>', methods=['GET'])
 def get_recommendation(symbol):
     """Get detailed recommendation for a specific stock"""
-    if latest_results is None:
+    index = current_index()
+    if index is None:
         return jsonify({'error': 'No results available'}), 404
     
-    # Find stock in results
-    stock = next((s for s in latest_results['all_stocks'] if s['symbol'] == symbol), None)
-    
-    if not stock:
+    try:
+        recommendation = index.recommendation(symbol, get_analyzer())
+    except KeyError:
         return jsonify({'error': 'Stock not found'}), 404
     
-    capital = analyzer.config.get('capital', 2400)
-    recommendation = analyzer.format_recommendation(stock, capital)
+    if recommendation is None:
+        return jsonify({'error': 'Could not load details for this stock'}), 500
     
     return jsonify(recommendation)
 
+@app.route('/api/recommendations', methods=['GET', 'POST'])
+def get_recommendations():
+    """Recommendations for many stocks in one call
+    
+    GET ?symbols=AAPL,MSFT or POST {"symbols": [...]}; with no symbols,
+    returns every top opportunity.
+    """
+    index = current_index()
+    if index is None:
+        return jsonify({'error': 'No results available'}), 404
+    
+    if request.method == 'POST':
+        symbols = (request.get_json(silent=True) or {}).get('symbols')
+    else:
+        symbols = request.args.get('symbols')
+        symbols = symbols.split(',') if symbols else None
+    if not symbols:
+        symbols = list(index.top)
+    
+    recommendations = {}
+    not_found = []
+    failed = []
+    for symbol in dict.fromkeys(s.strip().upper() for s in symbols if s.strip()):
+        try:
+            recommendation = index.recommendation(symbol, get_analyzer())
+        except KeyError:
+            not_found.append(symbol)
+            continue
+        if recommendation is None:
+            failed.append(symbol)
+        else:
+            recommendations[symbol] = recommendation
+    
+    return jsonify({
+        'recommendations': recommendations,
+        'not_found': not_found,
+        'failed': failed
+    })
+
+warmup_scheduler = start_warmup_scheduler()
+
 # ============================================================================
 # MAIN
 # ============================================================================
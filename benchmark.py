@@ -0,0 +1,448 @@
+"""
+BENCHMARK SCRIPT
+Offline throughput benchmarks on synthetic price data (no Yahoo calls)
+
+Usage:
+  python benchmark.py process-pool --symbols 2000 --workers 1 2 4
+  python benchmark.py suite --sizes 50 500 5000 20000 --save bench_baseline.json
+  python benchmark.py suite --sizes 50 500 --compare bench_baseline.json
+  python benchmark.py suite --sizes 500 --data-dir market_data
+  python benchmark.py parity --symbols 200
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import trading_system
+from trading_system import DataProvider, LiveTradingAnalyzer, LocalDirectoryProvider, load_config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ============================================================================
+# SYNTHETIC DATA
+# ============================================================================
+
+def synthetic_frames(n_symbols: int, n_bars: int = 252, seed: int = 0) -> dict:
+    """Deterministic random-walk OHLCV frames keyed SYM00000, SYM00001, ..."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end='2024-12-31', periods=n_bars)
+    frames = {}
+
+    for i in range(n_symbols):
+        frames[f'SYM{i:05d}'] = _random_walk(rng, index)
+
+    return frames
+
+def _random_walk(rng: np.random.Generator, index: pd.DatetimeIndex) -> pd.DataFrame:
+    n_bars = len(index)
+    drift = rng.normal(0.0004, 0.0006)
+    vol = rng.uniform(0.01, 0.035)
+    close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(drift, vol, n_bars)))
+    open_ = close * (1 + rng.normal(0, vol / 4, n_bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, vol / 2, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, vol / 2, n_bars)))
+    volume = rng.lognormal(14, 0.5, n_bars).round()
+    return pd.DataFrame(
+        {'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+        index=index
+    )
+
+def _symbol_rng(symbol: str, salt: int = 0) -> np.random.Generator:
+    """Same symbol, same numbers - in any process and any order"""
+    return np.random.default_rng([zlib.crc32(symbol.encode()), salt])
+
+NEWS_TEMPLATES = [
+    '{name} shares surge after earnings beat',
+    '{name} analysts upgrade on strong demand',
+    '{name} announces new product line',
+    '{name} holds annual shareholder meeting',
+    '{name} stock falls on guidance warning',
+    '{name} shares drop after downgrade',
+]
+
+def synthetic_news(symbol: str, n_articles: int = 5) -> list:
+    """Deterministic headlines mixing positive, neutral and negative keywords"""
+    picks = _symbol_rng(symbol, salt=1).integers(0, len(NEWS_TEMPLATES), n_articles)
+    return [{'title': NEWS_TEMPLATES[i].format(name=symbol)} for i in picks]
+
+def benchmark_sectors(symbols: list, per_sector: int = 50) -> dict:
+    """A universe split into sectors of `per_sector` (run_analysis takes 50 per sector)"""
+    return {
+        f'Sector {i // per_sector + 1:03d}': symbols[i:i + per_sector]
+        for i in range(0, len(symbols), per_sector)
+    }
+
+# ============================================================================
+# SYNTHETIC DATA PROVIDER
+# ============================================================================
+
+class SyntheticProvider(DataProvider):
+    """Offline data provider backed by the synthetic generators above
+    
+    Every symbol has deterministic history, company info and headlines.
+    `latency` adds a fixed delay per call to mimic the network.
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, n_bars: int = 252, latency: float = 0.0):
+        self.latency = latency
+        self.index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n_bars)
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def download(self, symbols: list, period='1y', start=None) -> dict:
+        self.wait()
+        return {symbol: self._frame(symbol, start) for symbol in symbols}
+
+    def history(self, symbol: str, period='1y', start=None):
+        self.wait()
+        return self._frame(symbol, start)
+
+    def info(self, symbol: str) -> dict:
+        self.wait()
+        return {'longName': f'{symbol} Holdings', 'sector': 'Synthetic'}
+
+    def news(self, symbol: str) -> list:
+        self.wait()
+        return synthetic_news(symbol)
+
+    def _frame(self, symbol: str, start=None) -> pd.DataFrame:
+        data = _random_walk(_symbol_rng(symbol), self.index)
+        if start is not None:
+            data = data[data.index >= pd.Timestamp(start)]
+        return data
+
+def make_analyzer(cache_dir: str, provider: DataProvider = None, **overrides) -> LiveTradingAnalyzer:
+    config = load_config()
+    config.update({
+        'price_cache_dir': cache_dir,
+        'metadata_cache_file': f'{cache_dir}/metadata_cache.json',
+        'results_store_file': f'{cache_dir}/results.db'
+    })
+    config.update(overrides)
+    return LiveTradingAnalyzer(config, provider=provider)
+
+# ============================================================================
+# BENCHMARKS
+# ============================================================================
+
+def bench_process_pool(n_symbols: int, worker_counts: list, repeats: int = 3):
+    """Phase-1 scoring time: serial per-symbol path vs process pools of each size"""
+    print(f"⚙️  Process-pool scoring benchmark: {n_symbols} synthetic symbols\n")
+
+    frames = synthetic_frames(n_symbols)
+    jobs = list(frames.items())
+    regime = {'regime': 'bull'}
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        serial = make_analyzer(cache_dir)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            baseline = [serial.score_stock(symbol, regime, data=data) for symbol, data in jobs]
+        serial_time = time.perf_counter() - start
+        print(f"  {'serial':>10}: {serial_time:7.2f}s  ({n_symbols / serial_time:8.0f} symbols/s)")
+
+        for workers in worker_counts:
+            analyzer = make_analyzer(cache_dir, factor_engine='process', process_workers=workers)
+            try:
+                analyzer.score_processes(jobs[:workers * 4], regime)  # Start the workers
+                best = float('inf')
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    results = analyzer.score_processes(jobs, regime)
+                    best = min(best, time.perf_counter() - start)
+            finally:
+                analyzer.close()
+
+            matches = all(
+                (a is None and b is None) or (a is not None and b is not None and a['score'] == b['score'])
+                for a, b in zip(baseline, results)
+            )
+            print(f"  {workers:>2} workers: {best:7.2f}s  ({n_symbols / best:8.0f} symbols/s)  "
+                  f"speedup {serial_time / best:4.1f}x  {'✅' if matches else '❌ results differ'}")
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _run_summary(results: dict, seconds: float, n_symbols: int) -> dict:
+    timing = results['timing']
+    return {
+        'seconds': round(seconds, 3),
+        'symbols_per_s': round(n_symbols / seconds, 1),
+        'analyzed': results['total_analyzed'],
+        'phases_ms': {phase: timing[f'{phase}_ms'] for phase in ('regime', 'download', 'score', 'enrich')},
+        'stages_ms': {stage: s['total_ms'] for stage, s in timing['stages'].items()},
+        'stage_peak_rss_mb': {stage: m['peak_rss_mb'] for stage, m in results['memory']['stages'].items()},
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+def recorded_symbols(data_dir: str) -> list:
+    """Symbols with price history in a local/recorded data directory"""
+    files = os.listdir(os.path.join(data_dir, 'history'))
+    return sorted({os.path.splitext(name)[0] for name in files if name.endswith(('.csv', '.parquet'))} - {'SPY'})
+
+def _bench_run(cache_dir: str, n_symbols: int, engine: str, n_bars: int, latency: float,
+               data_dir: str = None, memory_limit: int = 0) -> dict:
+    """One run over `cache_dir`, in a fresh process so peak RSS belongs to it alone
+    
+    An empty cache_dir makes it a cold run (every bar comes through the
+    provider); one a previous run filled makes it warm (no downloads,
+    full scoring).
+    """
+    if data_dir:
+        provider = LocalDirectoryProvider(data_dir)
+        symbols = recorded_symbols(data_dir)[:n_symbols]
+    else:
+        provider = SyntheticProvider(n_bars=n_bars, latency=latency)
+        symbols = [f'SYM{i:05d}' for i in range(n_symbols)]
+    trading_system.SECTORS = benchmark_sectors(symbols)
+    sectors = list(trading_system.SECTORS)
+    baseline = _peak_rss_mb()
+
+    analyzer = make_analyzer(cache_dir, provider, factor_engine=engine, memory_limit_mb=memory_limit)
+    try:
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            results = analyzer.run_analysis(enabled_sectors=sectors)
+        return {**_run_summary(results, time.perf_counter() - start, n_symbols), 'baseline_rss_mb': baseline}
+    finally:
+        analyzer.close()
+
+def bench_suite(sizes: list, engine: str = 'panel', n_bars: int = 252, latency: float = 0.0,
+                data_dir: str = None, memory_limit: int = 0) -> dict:
+    """End-to-end run_analysis throughput on universes of each size
+    
+    Synthetic data by default; with `data_dir`, the first symbols of a
+    local or recorded data directory (see LocalDirectoryProvider).
+    """
+    if data_dir:
+        available = len(recorded_symbols(data_dir))
+        sizes = sorted({min(size, available) for size in sizes})
+        print(f"📊 run_analysis benchmark: engine={engine}, {available} recorded symbols in {data_dir}\n")
+    else:
+        print(f"📊 run_analysis benchmark: engine={engine}, {n_bars} bars, "
+              f"provider latency {latency * 1000:.0f}ms\n")
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'engine': engine,
+        'n_bars': n_bars,
+        'latency_s': latency,
+        'data_dir': data_dir,
+        'memory_limit_mb': memory_limit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpus': multiprocessing.cpu_count(),
+        'sizes': {}
+    }
+
+    # ru_maxrss is a process-lifetime peak, so the warm run gets a process of its own too
+    context = multiprocessing.get_context('spawn')
+    for n_symbols in sizes:
+        result = {}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for mode in ('cold', 'warm'):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result[mode] = pool.submit(_bench_run, cache_dir, n_symbols, engine, n_bars, latency,
+                                               data_dir, memory_limit).result()
+        report['sizes'][str(n_symbols)] = result
+
+        for mode in ('cold', 'warm'):
+            run = result[mode]
+            phases = '  '.join(f"{phase} {ms / 1000:6.2f}s" for phase, ms in run['phases_ms'].items())
+            print(f"  {n_symbols:>6} {mode}: {run['seconds']:7.2f}s  {run['symbols_per_s']:8.0f} symbols/s  "
+                  f"peak {run['peak_rss_mb']} MB  |  {phases}")
+
+    return report
+
+def compare_reports(baseline: dict, current: dict, tolerance: float = 0.1) -> list:
+    """Print throughput and memory against `baseline`; return the regressions beyond `tolerance`"""
+    print(f"\n🔍 Compared with baseline from {baseline.get('created', '?')} (engine={baseline.get('engine')})")
+    if any(baseline.get(key) != current[key] for key in ('engine', 'n_bars', 'data_dir', 'memory_limit_mb')):
+        print("  ⚠️  Different engine, bar count, data or memory limit - numbers are not directly comparable")
+
+    regressions = []
+    for size, result in current['sizes'].items():
+        before = baseline.get('sizes', {}).get(size)
+        if before is None:
+            print(f"  {size:>6}: not in baseline")
+            continue
+
+        for mode in ('cold', 'warm'):
+            old, new = before[mode], result[mode]
+            speed = new['symbols_per_s'] / old['symbols_per_s'] - 1
+            memory = (new['peak_rss_mb'] / old['peak_rss_mb'] - 1) if old.get('peak_rss_mb') and new.get('peak_rss_mb') else 0.0
+            flag = '✅'
+            if speed < -tolerance or memory > tolerance:
+                flag = '❌'
+                regressions.append((size, mode))
+            print(f"  {size:>6} {mode}: {old['symbols_per_s']:8.0f} → {new['symbols_per_s']:8.0f} symbols/s "
+                  f"({speed:+6.1%})  peak {old.get('peak_rss_mb')} → {new.get('peak_rss_mb')} MB ({memory:+6.1%})  {flag}")
+
+            for stage, ms in sorted(new['stages_ms'].items()):
+                old_ms = old['stages_ms'].get(stage)
+                if old_ms and abs(ms / old_ms - 1) > tolerance and max(ms, old_ms) >= 50:
+                    print(f"           {stage:<18} {old_ms:9.1f} → {ms:9.1f} ms ({ms / old_ms - 1:+.1%})")
+
+    return regressions
+
+# ============================================================================
+# PARITY CHECKS
+# ============================================================================
+
+def _leaves(value, path=''):
+    """Flatten nested factor dicts into (path, value) pairs"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _leaves(item, f'{path}.{key}' if path else key)
+    else:
+        yield path, value
+
+def _differences(baseline: list, results: list, tolerance: float) -> tuple:
+    """Symbols whose result differs from the per-symbol baseline, and the largest score gap"""
+    mismatches = []
+    max_gap = 0.0
+    for a, b in zip(baseline, results):
+        if a is None or b is None:
+            if a is not b:
+                mismatches.append(((a or b)['symbol'], 'scored by only one engine'))
+            continue
+        max_gap = max(max_gap, abs(a['score'] - b['score']))
+        expected = dict(_leaves({'score': a['score'], 'factors': a['factors']}))
+        actual = dict(_leaves({'score': b['score'], 'factors': b['factors']}))
+        for path in expected.keys() | actual.keys():
+            x, y = expected.get(path), actual.get(path)
+            if isinstance(x, (int, float)) and isinstance(y, (int, float)) and \
+                    not isinstance(x, bool) and not isinstance(y, bool):
+                same = np.isclose(x, y, rtol=tolerance, atol=tolerance, equal_nan=True)
+            else:
+                same = x == y
+            if not same:
+                mismatches.append((a['symbol'], f'{path}: {x!r} != {y!r}'))
+                break
+    return mismatches, max_gap
+
+def _ranking(results: list) -> list:
+    scored = [r for r in results if r is not None]
+    return [r['symbol'] for r in sorted(scored, key=lambda r: (-r['score'], r['symbol']))]
+
+def _scoring_errors(log: str) -> list:
+    """Error lines printed while scoring (e.g. a panel falling back to per-symbol)"""
+    return [line for line in log.splitlines() if line.startswith('Error')]
+
+def check_parity(n_symbols: int, n_bars: int = 252, tolerance: float = 1e-9, new_bars: int = 5) -> bool:
+    """Panel and streaming engines against the per-symbol score_stock path"""
+    print(f"⚖️  Engine parity: {n_symbols} synthetic symbols, {n_bars} bars\n")
+
+    frames = synthetic_frames(n_symbols, n_bars)
+    # A few short histories, which every engine must reject
+    for symbol in list(frames)[:max(1, n_symbols // 20)]:
+        frames[symbol] = frames[symbol].iloc[-40:]
+    jobs = list(frames.items())
+
+    ok = True
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for regime in ('bull', 'bear', 'sideways'):
+            spy_regime = {'regime': regime}
+            analyzer = make_analyzer(cache_dir, factor_engine='per_symbol')
+            log = io.StringIO()
+            with redirect_stdout(log):
+                baseline = [analyzer.score_stock(symbol, spy_regime, data=data) for symbol, data in jobs]
+
+                panel = make_analyzer(cache_dir, factor_engine='panel').score_panel(jobs, spy_regime)
+
+                # Seed the indicator states short of the last bars, then stream those in
+                streaming = make_analyzer(tempfile.mkdtemp(dir=cache_dir), factor_engine='streaming')
+                streaming.score_streaming([(s, d.iloc[:-new_bars]) for s, d in jobs], spy_regime)
+                streamed = streaming.score_streaming(jobs, spy_regime)
+            errors = _scoring_errors(log.getvalue())
+
+            for engine, results in (('panel', panel), ('streaming', streamed)):
+                mismatches, max_gap = _differences(baseline, results, tolerance)
+                same_ranking = _ranking(baseline) == _ranking(results)
+                failed = bool(mismatches) or not same_ranking or bool(errors)
+                ok = ok and not failed
+                print(f"  {regime:>8} {engine:<9}: max score gap {max_gap:.2e}  "
+                      f"{'✅' if not failed else '❌'}")
+                for symbol, detail in mismatches[:5]:
+                    print(f"           {symbol}: {detail}")
+                if not same_ranking:
+                    print(f"           ranking differs")
+            for line in errors[:5]:
+                print(f"           {line}")
+    return ok
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the trading system')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pool = sub.add_parser('process-pool', help='Scaling of the process-pool scoring stage')
+    pool.add_argument('--symbols', type=int, default=2000)
+    pool.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    pool.add_argument('--repeats', type=int, default=3)
+
+    suite = sub.add_parser('suite', help='End-to-end run_analysis throughput, stage times and peak memory')
+    suite.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000, 20000])
+    suite.add_argument('--engine', default='panel', choices=['panel', 'per_symbol', 'streaming', 'process'])
+    suite.add_argument('--bars', type=int, default=252)
+    suite.add_argument('--latency', type=float, default=0.0, help='Simulated seconds per provider call')
+    suite.add_argument('--data-dir', help='Replay a local/recorded data directory instead of synthetic data')
+    suite.add_argument('--memory-limit', type=int, default=0, metavar='MB',
+                       help='Run in memory-bounded mode with this RSS ceiling')
+    suite.add_argument('--save', metavar='FILE', help='Write the results as a JSON baseline')
+    suite.add_argument('--compare', metavar='FILE', help='Compare against a saved baseline')
+    suite.add_argument('--tolerance', type=float, default=0.1,
+                       help='Relative slowdown/memory growth reported as a regression (default 0.1)')
+
+    parity = sub.add_parser('parity', help='Check the panel and streaming engines against per-symbol scoring')
+    parity.add_argument('--symbols', type=int, default=200)
+    parity.add_argument('--bars', type=int, default=252)
+    parity.add_argument('--tolerance', type=float, default=1e-9)
+
+    args = parser.parse_args()
+
+    if args.command == 'process-pool':
+        bench_process_pool(args.symbols, args.workers, args.repeats)
+    elif args.command == 'suite':
+        report = bench_suite(args.sizes, args.engine, args.bars, args.latency, args.data_dir,
+                             args.memory_limit)
+        regressions = []
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare_reports(json.load(f), report, args.tolerance)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Saved baseline to {args.save}")
+        if regressions:
+            sys.exit(1)
+    elif args.command == 'parity':
+        if not check_parity(args.symbols, args.bars, args.tolerance):
+            sys.exit(1)
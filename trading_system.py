@@ -9,11 +9,40 @@ pip install yfinance pandas numpy scipy flask flask-cors scikit-learn ta-lib new
 import yfinance as yf
 import pandas as pd
 import numpy as np
+import argparse
+import bisect
+import functools
+import gc
+import hashlib
+import heapq
 import json
+import marshal
+import math
+import multiprocessing
 import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from scipy import stats
+from itertools import zip_longest
+from zoneinfo import ZoneInfo
+from multiprocessing import shared_memory
+from scipy import stats, signal
 import warnings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 warnings.filterwarnings('ignore')
 
 # ============================================================================
@@ -93,6 +122,563 @@ SECTORS = {
     ]
 }
 
+# ============================================================================
+# METRICS (Latency histograms, counters and cache hit rates)
+# ============================================================================
+
+class Metrics:
+    """In-process counters and latency histograms, rendered for Prometheus
+
+    An observation is a perf_counter pair, a bisect and a short locked
+    update (a few microseconds), cheap enough to wrap per-symbol work.
+    `snapshot()` and `summary_since()` turn the running totals into a
+    per-run breakdown.
+    """
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    HELP = {
+        'stage_seconds': ('histogram', 'Latency of each pipeline stage'),
+        'http_request_seconds': ('histogram', 'Latency of each API endpoint'),
+        'errors_total': ('counter', 'Failures caught in each pipeline stage'),
+        'cache_requests_total': ('counter', 'Cache lookups by cache and result'),
+        'runs_total': ('counter', 'Completed analysis runs'),
+        'cache_hit_ratio': ('gauge', 'Share of cache lookups that were hits')
+    }
+
+    def __init__(self, prefix='trading'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._counters = {}    # (name, labels) -> value
+        self.profiler = None   # SamplingProfiler tracking stages, only while one runs
+
+    @staticmethod
+    def _labels(labels: dict) -> tuple:
+        return tuple(sorted(labels.items()))
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, self._labels(labels))
+        slot = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.BUCKETS) + 1) + [0.0]
+            histogram[slot] += 1
+            histogram[-1] += seconds
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def error(self, stage: str):
+        self.inc('errors_total', stage=stage)
+
+    def cache(self, cache: str, hit: bool):
+        self.inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+    @contextmanager
+    def time(self, stage: str):
+        """Time a block as `stage`, counting an error if it raises"""
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.error(stage)
+            raise
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+            if profiler is not None:
+                profiler.exit()
+
+    def timed(self, stage: str):
+        """Decorator form of `time`"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'stages': {dict(labels)['stage']: (sum(h[:-1]), h[-1])
+                           for (name, labels), h in self._histograms.items() if name == 'stage_seconds'},
+                'counters': dict(self._counters)
+            }
+
+    def summary_since(self, before: dict) -> dict:
+        """Per-stage calls/time, errors and cache hit rates since `before`"""
+        now = self.snapshot()
+        stages = {}
+        for stage, (count, total) in now['stages'].items():
+            count -= before['stages'].get(stage, (0, 0.0))[0]
+            total -= before['stages'].get(stage, (0, 0.0))[1]
+            if count:
+                stages[stage] = {
+                    'calls': count,
+                    'total_ms': round(total * 1000, 2),
+                    'mean_ms': round(total * 1000 / count, 3)
+                }
+
+        errors = {}
+        lookups = {}
+        for (name, labels), value in now['counters'].items():
+            value -= before['counters'].get((name, labels), 0)
+            if not value:
+                continue
+            labels = dict(labels)
+            if name == 'errors_total':
+                errors[labels['stage']] = value
+            elif name == 'cache_requests_total':
+                lookups.setdefault(labels['cache'], {'hit': 0, 'miss': 0})[labels['result']] += value
+
+        return {
+            'stages': stages,
+            'errors': errors,
+            'cache_hit_rate': {
+                cache: round(c['hit'] / (c['hit'] + c['miss']), 4) for cache, c in lookups.items()
+            }
+        }
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        def fmt(labels):
+            return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}' if labels else ''
+
+        with self._lock:
+            histograms = {key: list(h) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        # Hit ratio per cache, derived from the lookup counters
+        lookups = {}
+        for (name, labels), value in counters.items():
+            if name == 'cache_requests_total':
+                labels = dict(labels)
+                lookups.setdefault(labels['cache'], [0, 0])[labels['result'] == 'hit'] += value
+        gauges = {('cache_hit_ratio', (('cache', cache),)): hits / (hits + misses)
+                  for cache, (misses, hits) in lookups.items()}
+
+        lines = []
+        for name in sorted({key[0] for key in list(histograms) + list(counters) + list(gauges)}):
+            kind, text = self.HELP.get(name, ('counter', name))
+            full = f'{self.prefix}_{name}'
+            lines += [f'# HELP {full} {text}', f'# TYPE {full} {kind}']
+            for (metric, labels), h in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + ('+Inf',), h[:-1]):
+                    cumulative += count
+                    lines.append(f'{full}_bucket{fmt(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{full}_sum{fmt(labels)} {h[-1]:.6f}')
+                lines.append(f'{full}_count{fmt(labels)} {cumulative}')
+            for (metric, labels), value in sorted({**counters, **gauges}.items()):
+                if metric == name:
+                    lines.append(f'{full}{fmt(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+# ============================================================================
+# PROFILER (Sampling profiles of a run, per function and stage)
+# ============================================================================
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler for the threads doing a run's work
+    
+    While running, a background thread snapshots every `interval` seconds
+    the stack of the thread that started it, plus every thread currently
+    inside a `metrics.time` stage (busy pool workers). Each sample is
+    attributed to that thread's innermost stage. Stage tracking is only
+    switched on while a profiler runs; otherwise nothing is installed.
+    Worker processes of the 'process' factor engine are not sampled.
+    
+    Results: `summary()` (per stage and per function), `collapsed()`
+    (flamegraph.pl / speedscope input) and `pstats_data()` (a file
+    `pstats.Stats` and snakeviz can load; call counts are sample counts).
+    """
+    
+    OWNER_STAGE = 'run'  # Starting thread outside any timed stage
+    
+    def __init__(self, interval=0.005, max_depth=80):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = {}  # (stage, ((file, line, function), ...) root first) -> count
+        self.ticks = 0
+        self.started_at = None
+        self.duration = None
+        self._stages = {}  # thread id -> [stage, ...]
+        self._owner = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def enter(self, stage: str):
+        self._stages.setdefault(threading.get_ident(), []).append(stage)
+    
+    def exit(self):
+        stack = self._stages.get(threading.get_ident())
+        if stack:
+            stack.pop()
+    
+    def start(self):
+        if metrics.profiler is not None:
+            raise RuntimeError('A profile is already running')
+        self._owner = threading.get_ident()
+        self.started_at = time.perf_counter()
+        metrics.profiler = self
+        self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        if metrics.profiler is self:
+            metrics.profiler = None
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.ticks += 1
+            for thread_id, frame in sys._current_frames().items():
+                stages = self._stages.get(thread_id, [])[-1:]  # Slice: another thread may pop
+                if thread_id == own or (thread_id != self._owner and not stages):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                key = (stages[0] if stages else self.OWNER_STAGE, tuple(reversed(stack)))
+                self.samples[key] = self.samples.get(key, 0) + 1
+    
+    @property
+    def sample_seconds(self) -> float:
+        """Wall time one sample stands for (the loop's real tick length)"""
+        return (self.duration or time.perf_counter() - self.started_at) / max(self.ticks, 1)
+    
+    @staticmethod
+    def _label(frame: tuple) -> str:
+        return f"{os.path.basename(frame[0])}:{frame[2]}"
+    
+    def collapsed(self) -> str:
+        """One line per distinct stack: `stage;frame;...;frame count`"""
+        lines = {}
+        for (stage, stack), count in self.samples.items():
+            line = ';'.join([stage] + [self._label(f).replace(';', ':') for f in stack])
+            lines[line] = lines.get(line, 0) + count
+        return ''.join(f"{line} {count}\n" for line, count in sorted(lines.items()))
+    
+    def _function_totals(self):
+        """{frame: [self samples, total samples]} counting recursion once"""
+        totals = {}
+        for (_, stack), count in self.samples.items():
+            for frame in set(stack):
+                totals.setdefault(frame, [0, 0])[1] += count
+            if stack:
+                totals[stack[-1]][0] += count
+        return totals
+    
+    def summary(self, top=30) -> dict:
+        """Time per stage and the `top` functions by self time"""
+        ms = self.sample_seconds * 1000
+        total = sum(self.samples.values())
+        
+        stages = {}
+        for (stage, _), count in self.samples.items():
+            stages[stage] = stages.get(stage, 0) + count
+        
+        functions = sorted(self._function_totals().items(), key=lambda item: -item[1][0])[:top]
+        return {
+            'duration_s': round(self.duration or 0, 3),
+            'interval_ms': self.interval * 1000,
+            'ticks': self.ticks,
+            'samples': total,
+            'stages': {
+                stage: {'samples': count, 'ms': round(count * ms, 1),
+                        'pct': round(100 * count / max(total, 1), 1)}
+                for stage, count in sorted(stages.items(), key=lambda item: -item[1])
+            },
+            'functions': [
+                {'function': frame[2], 'file': frame[0], 'line': frame[1],
+                 'self_ms': round(own * ms, 1), 'total_ms': round(inclusive * ms, 1)}
+                for frame, (own, inclusive) in functions
+            ]
+        }
+    
+    def pstats_data(self) -> bytes:
+        """The samples as a marshalled pstats table (times in seconds)"""
+        seconds = self.sample_seconds
+        callers = {}
+        for (_, stack), count in self.samples.items():
+            for caller, callee in set(zip(stack, stack[1:])):
+                edge = callers.setdefault(callee, {}).setdefault(caller, [0, 0.0, 0.0])
+                edge[0] += count
+                edge[2] += count * seconds
+                if callee == stack[-1]:
+                    edge[1] += count * seconds
+        
+        stats = {}
+        for frame, (own, inclusive) in self._function_totals().items():
+            edges = {
+                caller: (n, n, tt, ct) for caller, (n, tt, ct) in callers.get(frame, {}).items()
+            }
+            stats[frame] = (inclusive, inclusive, own * seconds, inclusive * seconds, edges)
+        return marshal.dumps(stats)
+    
+    def save(self, prefix: str) -> list:
+        """Write <prefix>.json, .collapsed and .pstats; return the paths"""
+        paths = [f'{prefix}.json', f'{prefix}.collapsed', f'{prefix}.pstats']
+        with open(paths[0], 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(paths[1], 'w') as f:
+            f.write(self.collapsed())
+        with open(paths[2], 'wb') as f:
+            f.write(self.pstats_data())
+        return paths
+
+# ============================================================================
+# MEMORY MONITOR (Per-stage RSS, allocation tracing and a memory ceiling)
+# ============================================================================
+
+class MemoryMonitor:
+    """Memory use of one run, per stage, and the ceiling of memory-bounded mode
+    
+    Between `begin(stage)` and `end(stage)` the monitor records resident
+    memory (RSS) on entry and exit, plus the highest value `check()` saw
+    in between. run_analysis checks after every chunk and every finished
+    job. A stage entered once per chunk is reported as a whole. With
+    `trace_allocations`, tracemalloc runs between `start()` and `stop()`,
+    and each stage also reports its traced peak and the source lines
+    holding the most memory when it ended. Tracing slows allocation-heavy
+    code down noticeably, so it is opt-in.
+    
+    With `limit_mb` set, `allowed_workers(n)` is how many jobs may run at
+    once: all `n` below 80% of the limit, half of them up to the limit,
+    and one above it.
+    """
+    
+    THROTTLE_AT = 0.8
+    
+    def __init__(self, limit_mb=0, trace_allocations=False, top=10):
+        self.limit_mb = limit_mb
+        self.trace_allocations = trace_allocations
+        self.top = top
+        self.peak_mb = 0.0
+        self.throttled = 0  # allowed_workers calls that returned fewer than asked
+        self.releases = 0   # Times the caller dropped caches to get back under the limit
+        self._stages = {}   # name -> report entry
+        self._open = []     # Stages currently between begin and end
+        self._lock = threading.Lock()
+        self._tracing = False
+    
+    @staticmethod
+    def rss_mb() -> float:
+        """Current RSS in MB (the peak so far without /proc, 0 on Windows)"""
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+        except (OSError, ValueError, AttributeError):
+            pass
+        if resource is None:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (2**20 if sys.platform == 'darwin' else 1024)
+    
+    def start(self):
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self.check()
+        return self
+    
+    def stop(self):
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+    
+    def check(self) -> float:
+        rss = self.rss_mb()
+        with self._lock:
+            self.peak_mb = max(self.peak_mb, rss)
+            for name in self._open:
+                self._stages[name]['peak_rss_mb'] = max(self._stages[name]['peak_rss_mb'], rss)
+        return rss
+    
+    def over_limit(self) -> bool:
+        return bool(self.limit_mb) and self.check() > self.limit_mb
+    
+    def allowed_workers(self, workers: int) -> int:
+        if not self.limit_mb:
+            return workers
+        rss = self.check()
+        if rss > self.limit_mb:
+            allowed = 1
+        elif rss > self.limit_mb * self.THROTTLE_AT:
+            allowed = max(1, workers // 2)
+        else:
+            allowed = workers
+        if allowed < workers:
+            self.throttled += 1
+        return allowed
+    
+    def begin(self, stage: str):
+        rss = self.check()
+        with self._lock:
+            entry = self._stages.setdefault(stage, {
+                'entries': 0, 'rss_start_mb': rss, 'rss_end_mb': rss, 'peak_rss_mb': rss
+            })
+            entry['entries'] += 1
+            self._open.append(stage)
+        if self._tracing:
+            tracemalloc.reset_peak()
+    
+    def end(self, stage: str):
+        rss = self.check()
+        with self._lock:
+            self._open.remove(stage)
+            entry = self._stages[stage]
+            entry['rss_end_mb'] = rss
+        if self._tracing:
+            self._trace(entry)
+    
+    @contextmanager
+    def stage(self, stage: str):
+        self.begin(stage)
+        try:
+            yield
+        finally:
+            self.end(stage)
+    
+    def _trace(self, entry: dict):
+        """Traced peak, and the top lines from the entry with the highest peak"""
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        if peak <= entry.get('traced_peak_mb', -1):
+            return
+        entry['traced_peak_mb'] = peak
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        entry['top_allocations'] = [
+            {'where': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:self.top]
+        ]
+    
+    def report(self) -> dict:
+        def rounded(entry):
+            return {k: round(v, 1) if isinstance(v, float) else v for k, v in entry.items()}
+        
+        with self._lock:
+            stages = {name: rounded(entry) for name, entry in self._stages.items()}
+        peak = None
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = round(peak / (2**20 if sys.platform == 'darwin' else 1024), 1)
+        return {
+            'limit_mb': self.limit_mb or None,
+            'peak_rss_mb': round(self.peak_mb, 1),
+            'process_peak_rss_mb': peak,
+            'throttled': self.throttled,
+            'releases': self.releases,
+            'trace_allocations': self.trace_allocations,
+            'stages': stages
+        }
+
+# ============================================================================
+# INDICATOR CONTEXT (Shared per-symbol intermediates)
+# ============================================================================
+
+class IndicatorContext:
+    """Memoized derived series for one symbol's price frame
+
+    Pass one to calculate_factors, predict_targets and detect_regime so
+    that closes, returns, shifted closes, true range and rolling windows
+    are each computed only once. analyze_stock shares one context between
+    scoring and predictions. The panel, streaming and process engines in
+    run_analysis compute factors without one, so there enrichment builds
+    the finalists' contexts. Hits and misses go to the metrics as the
+    'indicator_context' cache.
+    """
+    
+    def __init__(self, data: pd.DataFrame):
+        self.data = data
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def _memo(self, key, compute):
+        if key in self._cache:
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        value = self._cache[key] = compute()
+        return value
+    
+    @property
+    def close(self) -> pd.Series:
+        return self._memo('close', lambda: self.data['Close'])
+    
+    @property
+    def returns(self) -> pd.Series:
+        return self._memo('returns', lambda: self.close.pct_change())
+    
+    @property
+    def prev_close(self) -> pd.Series:
+        return self._memo('prev_close', lambda: self.close.shift())
+    
+    @property
+    def delta(self) -> pd.Series:
+        return self._memo('delta', lambda: self.close.diff())
+    
+    @property
+    def true_range(self) -> pd.Series:
+        def compute():
+            high, low, prev_close = self.data['High'], self.data['Low'], self.prev_close
+            high_low = high - low
+            high_close = abs(high - prev_close)
+            low_close = abs(low - prev_close)
+            return pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+        return self._memo('true_range', compute)
+    
+    def price(self) -> float:
+        return self._memo('price', lambda: float(self.close.iloc[-1]))
+    
+    def sma(self, window: int) -> pd.Series:
+        return self._memo(('sma', window), lambda: self.close.rolling(window).mean())
+    
+    def rolling_std(self, window: int) -> pd.Series:
+        return self._memo(('std', window), lambda: self.close.rolling(window).std())
+    
+    def returns_std(self, window: int) -> pd.Series:
+        return self._memo(('returns_std', window), lambda: self.returns.rolling(window).std())
+    
+    def atr(self, window: int = 14) -> float:
+        return self._memo(('atr', window), lambda: self.true_range.rolling(window).mean().iloc[-1])
+    
+    def report(self):
+        """Add the lookups since the last report to the metrics"""
+        if self.hits:
+            metrics.inc('cache_requests_total', self.hits, cache='indicator_context', result='hit')
+        if self.misses:
+            metrics.inc('cache_requests_total', self.misses, cache='indicator_context', result='miss')
+        self.hits = self.misses = 0
+
 # ============================================================================
 # REGIME DETECTOR (from your backtest.py)
 # ============================================================================
@@ -101,19 +687,20 @@ class RegimeDetector:
     """Detect market regime from SPY data"""
     
     @staticmethod
-    def detect_regime(spy_data: pd.DataFrame) -> dict:
+    @metrics.timed('detect_regime')
+    def detect_regime(spy_data: pd.DataFrame, ctx: IndicatorContext = None) -> dict:
         if len(spy_data) < 100:
             return {'regime': 'unknown', 'confidence': 0, 'volatility': 0}
         
-        price = float(spy_data['Close'].iloc[-1])
-        ma20 = float(spy_data['Close'].rolling(20).mean().iloc[-1])
-        ma50 = float(spy_data['Close'].rolling(50).mean().iloc[-1])
-        ma100 = float(spy_data['Close'].rolling(100).mean().iloc[-1])
+        ctx = ctx or IndicatorContext(spy_data)
+        price = ctx.price()
+        ma20 = float(ctx.sma(20).iloc[-1])
+        ma50 = float(ctx.sma(50).iloc[-1])
+        ma100 = float(ctx.sma(100).iloc[-1])
         
-        returns = spy_data['Close'].pct_change()
-        vol20 = float(returns.rolling(20).std().iloc[-1] * np.sqrt(252))
+        vol20 = float(ctx.returns_std(20).iloc[-1] * np.sqrt(252))
         
-        mom_3m = float((price / spy_data['Close'].iloc[-60] - 1)) if len(spy_data) >= 60 else 0.0
+        mom_3m = float((price / ctx.close.iloc[-60] - 1)) if len(spy_data) >= 60 else 0.0
         
         if price > ma20 > ma50 > ma100 and mom_3m > 0.05:
             regime = 'strong_bull'
@@ -138,25 +725,27 @@ class MultiFactorAnalyzer:
     """Multi-factor analysis with enhancements"""
     
     @staticmethod
-    def calculate_factors(data: pd.DataFrame, symbol: str) -> dict:
+    @metrics.timed('calculate_factors')
+    def calculate_factors(data: pd.DataFrame, symbol: str, ctx: IndicatorContext = None) -> dict:
         if len(data) < 60:
             return None
         
         try:
-            price = float(data['Close'].iloc[-1])
-            returns = data['Close'].pct_change()
+            ctx = ctx or IndicatorContext(data)
+            close = ctx.close
+            price = ctx.price()
             
             # Momentum
-            mom_1m = float((price / data['Close'].iloc[-20] - 1)) if len(data) >= 20 else 0.0
-            mom_3m = float((price / data['Close'].iloc[-60] - 1)) if len(data) >= 60 else 0.0
+            mom_1m = float((price / close.iloc[-20] - 1)) if len(data) >= 20 else 0.0
+            mom_3m = float((price / close.iloc[-60] - 1)) if len(data) >= 60 else 0.0
             
             # Volatility
-            vol_20d = float(returns.rolling(20).std().iloc[-1] * np.sqrt(252))
+            vol_20d = float(ctx.returns_std(20).iloc[-1] * np.sqrt(252))
             
             # Trend
-            ma10 = float(data['Close'].rolling(10).mean().iloc[-1])
-            ma20 = float(data['Close'].rolling(20).mean().iloc[-1])
-            ma50 = float(data['Close'].rolling(50).mean().iloc[-1])
+            ma10 = float(ctx.sma(10).iloc[-1])
+            ma20 = float(ctx.sma(20).iloc[-1])
+            ma50 = float(ctx.sma(50).iloc[-1])
             
             trend_score = 0
             if price > ma10: trend_score += 1
@@ -172,7 +761,7 @@ class MultiFactorAnalyzer:
             volume_surge = recent_volume / avg_volume if avg_volume > 0 else 1.0
             
             # RSI calculation
-            delta = data['Close'].diff()
+            delta = ctx.delta
             gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
             loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
             rs = gain / loss
@@ -180,8 +769,8 @@ class MultiFactorAnalyzer:
             current_rsi = float(rsi.iloc[-1]) if not pd.isna(rsi.iloc[-1]) else 50
             
             # MACD calculation
-            ema12 = data['Close'].ewm(span=12, adjust=False).mean()
-            ema26 = data['Close'].ewm(span=26, adjust=False).mean()
+            ema12 = close.ewm(span=12, adjust=False).mean()
+            ema26 = close.ewm(span=26, adjust=False).mean()
             macd_line = ema12 - ema26
             signal_line = macd_line.ewm(span=9, adjust=False).mean()
             macd_histogram = macd_line - signal_line
@@ -196,8 +785,8 @@ class MultiFactorAnalyzer:
             # Bollinger Bands calculation
             bb_period = 20
             bb_std = 2
-            bb_middle = data['Close'].rolling(window=bb_period).mean()
-            bb_std_dev = data['Close'].rolling(window=bb_period).std()
+            bb_middle = ctx.sma(bb_period)
+            bb_std_dev = ctx.rolling_std(bb_period)
             bb_upper = bb_middle + (bb_std_dev * bb_std)
             bb_lower = bb_middle - (bb_std_dev * bb_std)
             
@@ -289,6 +878,518 @@ class MultiFactorAnalyzer:
         score = sum(factors[f]['score'] * w for f, w in weights.items())
         return score
 
+# ============================================================================
+# PANEL FACTOR ENGINE (Vectorized cross-sectional factors)
+# ============================================================================
+
+class PanelFactorEngine:
+    """Compute MultiFactorAnalyzer factors for a whole universe at once
+
+    Prices are laid out as a bars x symbols panel. Each column is
+    right-aligned on the symbol's latest bar, with NaN padding above its
+    first bar. The row position therefore means the same thing for every
+    symbol, as it does in the per-symbol `.iloc[-n]` code. All values
+    match MultiFactorAnalyzer.calculate_factors to floating-point tolerance.
+    """
+    
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+    
+    @staticmethod
+    def build_panel(frames: dict) -> dict:
+        """Stack {symbol: DataFrame} into right-aligned 2-D arrays"""
+        symbols = list(frames.keys())
+        lengths = np.array([len(frames[s]) for s in symbols], dtype=int)
+        depth = int(lengths.max()) if len(symbols) else 0
+        
+        stacked = np.full((len(PanelFactorEngine.COLUMNS), depth, len(symbols)), np.nan)
+        for j, symbol in enumerate(symbols):
+            if lengths[j]:
+                data = frames[symbol]
+                if list(data.columns) != PanelFactorEngine.COLUMNS:
+                    data = data[PanelFactorEngine.COLUMNS]
+                values = data.to_numpy(dtype='float64')
+                stacked[:, depth - lengths[j]:, j] = values.T
+        
+        panel = {'symbols': symbols, 'lengths': lengths}
+        for k, col in enumerate(PanelFactorEngine.COLUMNS):
+            panel[col] = stacked[k]
+        return panel
+    
+    @staticmethod
+    def _ewm(values: np.ndarray, span: int) -> np.ndarray:
+        """ewm(span, adjust=False).mean() down each column of a backfilled panel"""
+        alpha = 2.0 / (span + 1)
+        zi = ((1 - alpha) * values[0])[np.newaxis, :]
+        out, _ = signal.lfilter([alpha], [1.0, alpha - 1.0], values, axis=0, zi=zi)
+        return out
+    
+    @staticmethod
+    @metrics.timed('panel_factors')
+    def calculate_factors(panel: dict) -> dict:
+        """Return the factor table: {factor name: 1-D array over symbols}"""
+        close = panel['Close']
+        high = panel['High']
+        low = panel['Low']
+        volume = panel['Volume']
+        lengths = panel['lengths']
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price = close[-1]
+            returns = close[1:] / close[:-1] - 1
+            
+            # Momentum
+            mom_1m = price / close[-20] - 1
+            mom_3m = price / close[-60] - 1
+            
+            # Volatility
+            vol_20d = np.std(returns[-20:], axis=0, ddof=1) * np.sqrt(252)
+            
+            # Trend
+            ma10 = close[-10:].mean(axis=0)
+            ma20 = close[-20:].mean(axis=0)
+            ma50 = close[-50:].mean(axis=0)
+            trend_score = ((price > ma10).astype(float) + (price > ma20) + (price > ma50) +
+                           (ma10 > ma20) + (ma20 > ma50)) / 5.0
+            
+            # Volume
+            avg_volume = volume[-20:].mean(axis=0)
+            recent_volume = volume[-1]
+            volume_surge = np.where(avg_volume > 0, recent_volume / avg_volume, 1.0)
+            
+            # RSI
+            delta = np.diff(close[-15:], axis=0)
+            gain = np.where(delta > 0, delta, 0).mean(axis=0)
+            loss = np.where(delta < 0, -delta, 0).mean(axis=0)
+            rsi = 100 - (100 / (1 + gain / loss))
+            rsi = np.where(np.isnan(rsi), 50, rsi)
+            
+            # MACD (leading NaNs backfilled so every EMA starts at the first bar)
+            filled = pd.DataFrame(close).bfill().to_numpy()
+            macd_line = PanelFactorEngine._ewm(filled, 12) - PanelFactorEngine._ewm(filled, 26)
+            signal_line = PanelFactorEngine._ewm(macd_line, 9)
+            histogram = macd_line - signal_line
+            current_macd = macd_line[-1]
+            current_signal = signal_line[-1]
+            macd_crossover = np.where(
+                (current_macd > current_signal) & (histogram[-2] <= 0), 'bullish',
+                np.where((current_macd < current_signal) & (histogram[-2] >= 0), 'bearish', 'neutral')
+            )
+            
+            # Bollinger Bands
+            bb_std_dev = np.std(close[-20:], axis=0, ddof=1)
+            bb_upper = ma20 + bb_std_dev * 2
+            bb_lower = ma20 - bb_std_dev * 2
+            bb_position = ((price - bb_lower) / (bb_upper - bb_lower)) * 100
+            bb_signal = np.where(bb_position < 20, 'oversold',
+                                 np.where(bb_position > 80, 'overbought', 'neutral'))
+            
+            # Support/Resistance levels
+            high_52w = np.nanmax(high[-252:], axis=0)
+            low_52w = np.nanmin(low[-252:], axis=0)
+            
+            table = {
+                'symbols': panel['symbols'],
+                # Same exclusions as the per-symbol path (short history, flat bands)
+                'valid': (lengths >= 60) & (bb_upper != bb_lower),
+                'price': price,
+                'mom_1m': mom_1m,
+                'mom_3m': mom_3m,
+                'momentum_score': 50 + (mom_1m * 100),
+                'vol_20d': vol_20d,
+                'volatility_score': np.clip(100 - vol_20d * 100, 0, 100),
+                'trend_score': trend_score * 100,
+                'ma10': ma10,
+                'ma20': ma20,
+                'ma50': ma50,
+                'volume_surge': volume_surge,
+                'volume_score': np.clip(50 + (volume_surge - 1) * 50, 0, 100),
+                'rsi': rsi,
+                'macd': current_macd,
+                'macd_signal': current_signal,
+                'macd_histogram': histogram[-1],
+                'macd_crossover': macd_crossover,
+                'bb_upper': bb_upper,
+                'bb_middle': ma20,
+                'bb_lower': bb_lower,
+                'bb_position': bb_position,
+                'bb_signal': bb_signal,
+                'high_52w': high_52w,
+                'low_52w': low_52w,
+                'distance_from_high': ((price - high_52w) / high_52w) * 100,
+                'distance_from_low': ((price - low_52w) / low_52w) * 100
+            }
+        return table
+    
+    @staticmethod
+    def composite_scores(table: dict, regime: str) -> np.ndarray:
+        """Vectorized MultiFactorAnalyzer.composite_score"""
+        weights = {'momentum': 0.35, 'volatility': 0.20, 'trend': 0.30, 'volume': 0.15}
+        
+        if regime in ['strong_bull', 'bull']:
+            weights['momentum'] = 0.45
+            weights['trend'] = 0.30
+        elif regime in ['strong_bear', 'bear']:
+            weights['volatility'] = 0.35
+            weights['momentum'] = 0.20
+        
+        return sum(table[f'{f}_score'] * w for f, w in weights.items())
+    
+    @staticmethod
+    def to_factor_dicts(table: dict) -> dict:
+        """Expand the table into {symbol: factors} in calculate_factors' format"""
+        cols = {k: v.tolist() for k, v in table.items() if isinstance(v, np.ndarray)}
+        factors = {}
+        for j, symbol in enumerate(table['symbols']):
+            if not cols['valid'][j]:
+                continue
+            factors[symbol] = {
+                'momentum': {'1m': cols['mom_1m'][j], '3m': cols['mom_3m'][j], 'score': cols['momentum_score'][j]},
+                'volatility': {'20d': cols['vol_20d'][j], 'score': cols['volatility_score'][j]},
+                'trend': {
+                    'score': cols['trend_score'][j],
+                    'ma10': cols['ma10'][j],
+                    'ma20': cols['ma20'][j],
+                    'ma50': cols['ma50'][j]
+                },
+                'volume': {'surge': cols['volume_surge'][j], 'score': cols['volume_score'][j]},
+                'rsi': cols['rsi'][j],
+                'macd': {
+                    'value': cols['macd'][j],
+                    'signal': cols['macd_signal'][j],
+                    'histogram': cols['macd_histogram'][j],
+                    'crossover': cols['macd_crossover'][j]
+                },
+                'bollinger': {
+                    'upper': cols['bb_upper'][j],
+                    'middle': cols['bb_middle'][j],
+                    'lower': cols['bb_lower'][j],
+                    'position': cols['bb_position'][j],
+                    'signal': cols['bb_signal'][j]
+                },
+                'price_levels': {
+                    'current': cols['price'][j],
+                    'high_52w': cols['high_52w'][j],
+                    'low_52w': cols['low_52w'][j],
+                    'distance_from_high': cols['distance_from_high'][j],
+                    'distance_from_low': cols['distance_from_low'][j]
+                }
+            }
+        return factors
+
+# ============================================================================
+# STREAMING INDICATOR STATE (O(1) per new bar)
+# ============================================================================
+
+class RollingWindow:
+    """Fixed-size window with running sum and sum of squares"""
+    
+    RESYNC_EVERY = 256  # Recompute sums periodically to stop rounding drift
+    
+    def __init__(self, size: int, values=None):
+        self.size = size
+        self.values = deque(values or [], maxlen=size)
+        self._resync()
+    
+    def _resync(self):
+        self.total = math.fsum(self.values)
+        self.total_sq = math.fsum(v * v for v in self.values)
+        self._updates = 0
+    
+    def push(self, value: float):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+        self._updates += 1
+        if self._updates >= self.RESYNC_EVERY:
+            self._resync()
+    
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.size
+    
+    def mean(self) -> float:
+        return self.total / len(self.values)
+    
+    def std(self) -> float:
+        """Sample standard deviation (ddof=1), like pandas rolling().std()"""
+        n = len(self.values)
+        var = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(var, 0.0))
+
+
+class RollingExtreme:
+    """Max (or min) over the last `size` values using a monotonic deque"""
+    
+    def __init__(self, size: int, mode='max'):
+        self.size = size
+        self.mode = mode
+        self.count = 0
+        self.window = deque()  # (position, value), monotonic
+    
+    def push(self, value: float):
+        better = (lambda a, b: a >= b) if self.mode == 'max' else (lambda a, b: a <= b)
+        while self.window and better(value, self.window[-1][1]):
+            self.window.pop()
+        self.window.append((self.count, value))
+        self.count += 1
+        while self.window[0][0] <= self.count - 1 - self.size:
+            self.window.popleft()
+    
+    def value(self) -> float:
+        return self.window[0][1]
+
+
+class IndicatorState:
+    """Per-symbol indicator state advanced one bar at a time
+
+    Covers everything MultiFactorAnalyzer.calculate_factors and the ATR-14
+    in PredictionEngine.predict_targets need. Each `update` does a constant
+    amount of work; `factors()` returns the same dict calculate_factors would
+    for the bars seen so far. State round-trips through to_dict/from_dict.
+    """
+    
+    EMA_SPANS = {'ema12': 12, 'ema26': 26, 'signal': 9}
+    
+    def __init__(self):
+        self.bars = 0
+        self.last_date = None
+        self.last_bar = None
+        self.prev_close = None
+        self.closes = deque(maxlen=60)     # Momentum lookbacks
+        self.ma10 = RollingWindow(10)
+        self.ma20 = RollingWindow(20)      # Also the Bollinger window
+        self.ma50 = RollingWindow(50)
+        self.returns = RollingWindow(20)
+        self.volume = RollingWindow(20)
+        self.gains = RollingWindow(14)
+        self.losses = RollingWindow(14)
+        self.true_range = RollingWindow(14)
+        self.high_52w = RollingExtreme(252, 'max')
+        self.low_52w = RollingExtreme(252, 'min')
+        self.ema12 = None
+        self.ema26 = None
+        self.signal = None
+        self.prev_histogram = None
+    
+    @classmethod
+    def from_history(cls, data: pd.DataFrame) -> 'IndicatorState':
+        """Seed a state by replaying a price history"""
+        state = cls()
+        for date, o, h, l, c, v in zip(data.index, data['Open'], data['High'], data['Low'],
+                                       data['Close'], data['Volume']):
+            state.update({'Open': o, 'High': h, 'Low': l, 'Close': c, 'Volume': v}, date)
+        return state
+    
+    @staticmethod
+    def _ema(prev, value, span):
+        if prev is None:
+            return value
+        alpha = 2.0 / (span + 1)
+        return (1 - alpha) * prev + alpha * value
+    
+    def update(self, bar: dict, date=None):
+        """Advance every indicator by one bar ({'Open', 'High', 'Low', 'Close', 'Volume'})"""
+        close = float(bar['Close'])
+        high = float(bar['High'])
+        low = float(bar['Low'])
+        
+        if self.prev_close is None:
+            self.gains.push(0.0)
+            self.losses.push(0.0)
+            self.true_range.push(high - low)
+        else:
+            delta = close - self.prev_close
+            self.gains.push(delta if delta > 0 else 0.0)
+            self.losses.push(-delta if delta < 0 else 0.0)
+            self.returns.push(close / self.prev_close - 1)
+            self.true_range.push(max(high - low, abs(high - self.prev_close), abs(low - self.prev_close)))
+        
+        self.closes.append(close)
+        self.ma10.push(close)
+        self.ma20.push(close)
+        self.ma50.push(close)
+        self.volume.push(float(bar['Volume']))
+        self.high_52w.push(high)
+        self.low_52w.push(low)
+        
+        if self.signal is not None:
+            self.prev_histogram = (self.ema12 - self.ema26) - self.signal
+        self.ema12 = self._ema(self.ema12, close, 12)
+        self.ema26 = self._ema(self.ema26, close, 26)
+        self.signal = self._ema(self.signal, self.ema12 - self.ema26, 9)
+        
+        self.prev_close = close
+        self.bars += 1
+        self.last_bar = {k: float(bar[k]) for k in ('Open', 'High', 'Low', 'Close', 'Volume')}
+        if date is not None:
+            self.last_date = pd.Timestamp(date).isoformat()
+    
+    @property
+    def atr(self) -> float:
+        """ATR-14 as used by PredictionEngine.predict_targets"""
+        return self.true_range.mean() if self.true_range.full else float('nan')
+    
+    def factors(self) -> dict:
+        """Factor dict identical to MultiFactorAnalyzer.calculate_factors"""
+        if self.bars < 60:
+            return None
+        
+        price = self.prev_close
+        mom_1m = price / self.closes[-20] - 1
+        mom_3m = price / self.closes[-60] - 1
+        vol_20d = self.returns.std() * math.sqrt(252)
+        
+        ma10, ma20, ma50 = self.ma10.mean(), self.ma20.mean(), self.ma50.mean()
+        trend_score = (int(price > ma10) + int(price > ma20) + int(price > ma50) +
+                       int(ma10 > ma20) + int(ma20 > ma50)) / 5.0
+        
+        avg_volume = self.volume.mean()
+        volume_surge = self.last_bar['Volume'] / avg_volume if avg_volume > 0 else 1.0
+        
+        gain, loss = self.gains.mean(), self.losses.mean()
+        if loss == 0:
+            current_rsi = 50 if gain == 0 else 100.0
+        else:
+            current_rsi = 100 - (100 / (1 + gain / loss))
+        
+        current_macd = self.ema12 - self.ema26
+        current_signal = self.signal
+        current_histogram = current_macd - current_signal
+        macd_crossover = 'bullish' if current_macd > current_signal and self.prev_histogram <= 0 else \
+                        'bearish' if current_macd < current_signal and self.prev_histogram >= 0 else \
+                        'neutral'
+        
+        bb_std_dev = self.ma20.std()
+        bb_upper = ma20 + bb_std_dev * 2
+        bb_lower = ma20 - bb_std_dev * 2
+        if bb_upper == bb_lower:
+            return None
+        bb_position = ((price - bb_lower) / (bb_upper - bb_lower)) * 100
+        bb_signal = 'oversold' if bb_position < 20 else \
+                   'overbought' if bb_position > 80 else \
+                   'neutral'
+        
+        high_52w = self.high_52w.value()
+        low_52w = self.low_52w.value()
+        
+        return {
+            'momentum': {'1m': mom_1m, '3m': mom_3m, 'score': 50 + (mom_1m * 100)},
+            'volatility': {'20d': vol_20d, 'score': max(0, min(100, 100 - vol_20d * 100))},
+            'trend': {'score': trend_score * 100, 'ma10': ma10, 'ma20': ma20, 'ma50': ma50},
+            'volume': {'surge': volume_surge, 'score': min(100, max(0, 50 + (volume_surge - 1) * 50))},
+            'rsi': current_rsi,
+            'macd': {
+                'value': current_macd,
+                'signal': current_signal,
+                'histogram': current_histogram,
+                'crossover': macd_crossover
+            },
+            'bollinger': {
+                'upper': bb_upper,
+                'middle': ma20,
+                'lower': bb_lower,
+                'position': bb_position,
+                'signal': bb_signal
+            },
+            'price_levels': {
+                'current': price,
+                'high_52w': high_52w,
+                'low_52w': low_52w,
+                'distance_from_high': ((price - high_52w) / high_52w) * 100,
+                'distance_from_low': ((price - low_52w) / low_52w) * 100
+            }
+        }
+    
+    def to_dict(self) -> dict:
+        """JSON-serializable snapshot"""
+        windows = ('ma10', 'ma20', 'ma50', 'returns', 'volume', 'gains', 'losses', 'true_range')
+        return {
+            'bars': self.bars,
+            'last_date': self.last_date,
+            'last_bar': self.last_bar,
+            'prev_close': self.prev_close,
+            'closes': list(self.closes),
+            'windows': {name: list(getattr(self, name).values) for name in windows},
+            'extremes': {
+                name: {'count': ext.count, 'window': [list(item) for item in ext.window]}
+                for name, ext in (('high_52w', self.high_52w), ('low_52w', self.low_52w))
+            },
+            'ema12': self.ema12,
+            'ema26': self.ema26,
+            'signal': self.signal,
+            'prev_histogram': self.prev_histogram
+        }
+    
+    @classmethod
+    def from_dict(cls, payload: dict) -> 'IndicatorState':
+        state = cls()
+        for key in ('bars', 'last_date', 'last_bar', 'prev_close', 'ema12', 'ema26', 'signal', 'prev_histogram'):
+            setattr(state, key, payload[key])
+        state.closes.extend(payload['closes'])
+        for name, values in payload['windows'].items():
+            window = getattr(state, name)
+            setattr(state, name, RollingWindow(window.size, values))
+        for name, ext in payload['extremes'].items():
+            extreme = getattr(state, name)
+            extreme.count = ext['count']
+            extreme.window = deque(tuple(item) for item in ext['window'])
+        return state
+
+class IndicatorStateStore:
+    """Keep one IndicatorState per symbol, persisted to a JSON file
+
+    `advance` appends only the bars newer than the stored state. If the
+    stored last bar no longer matches the history (a revised intraday bar,
+    a gap, a fresh symbol), the state is reseeded from the full history.
+    """
+    
+    def __init__(self, path='price_cache/indicator_state.json'):
+        self.path = path
+        self._states = {}
+        self._dirty = False
+        
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self._states = {s: IndicatorState.from_dict(p) for s, p in json.load(f).items()}
+            except Exception as e:
+                print(f"Error reading indicator state: {e}")
+    
+    def get(self, symbol: str):
+        return self._states.get(symbol)
+    
+    def advance(self, symbol: str, data: pd.DataFrame) -> IndicatorState:
+        """Bring a symbol's state up to the last bar of `data`"""
+        state = self._states.get(symbol)
+        
+        if state is not None and state.last_date is not None:
+            last = pd.Timestamp(state.last_date)
+            if last in data.index and float(data.at[last, 'Close']) == state.last_bar['Close']:
+                new_bars = data[data.index > last]
+                for date, row in zip(new_bars.index, new_bars.to_dict('records')):
+                    state.update(row, date)
+                self._dirty = self._dirty or len(new_bars) > 0
+                return state
+        
+        state = IndicatorState.from_history(data)
+        self._states[symbol] = state
+        self._dirty = True
+        return state
+    
+    def flush(self):
+        """Write all states to disk if anything changed"""
+        if not self._dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({s: state.to_dict() for s, state in self._states.items()}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
 # ============================================================================
 # CANDLESTICK PATTERN DETECTOR
 # ============================================================================
@@ -297,6 +1398,7 @@ class CandlestickPatternDetector:
     """Detect candlestick patterns"""
     
     @staticmethod
+    @metrics.timed('detect_patterns')
     def detect_patterns(data: pd.DataFrame) -> list:
         patterns = []
         
@@ -389,18 +1491,275 @@ class CandlestickPatternDetector:
                 c0['Close'] < c0['Open'] and  # Third candle red
                 c0['Close'] < (c2['Open'] + c2['Close']) / 2)  # Closes below midpoint
 
+# ============================================================================
+# DATA PROVIDERS (Where prices, company info and news come from)
+# ============================================================================
+
+class DataProvider(ABC):
+    """Source of daily OHLCV, company info and headlines
+    
+    Backends must implement `history`, `info` and `news` (one that
+    doesn't fails when constructed); `download` is the batched form of
+    `history` and falls back to one call per symbol. Missing symbols are
+    left out of `download` and return None from `history`.
+    """
+    
+    name = 'base'
+    
+    def download(self, symbols: list, period='1y', start=None) -> dict:
+        """Return {symbol: DataFrame} for every symbol that has data"""
+        frames = {}
+        for symbol in symbols:
+            data = self.history(symbol, period=period, start=start)
+            if data is not None:
+                frames[symbol] = data
+        return frames
+    
+    @abstractmethod
+    def history(self, symbol: str, period='1y', start=None):
+        """Daily OHLCV DataFrame for one symbol, or None"""
+    
+    @abstractmethod
+    def info(self, symbol: str) -> dict:
+        """Company info dict (empty if unknown)"""
+    
+    @abstractmethod
+    def news(self, symbol: str) -> list:
+        """Recent headlines as dicts"""
+
+class YahooProvider(DataProvider):
+    """Live data from Yahoo Finance through yfinance"""
+    
+    name = 'yahoo'
+    
+    def download(self, symbols: list, period='1y', start=None) -> dict:
+        window = {'start': start} if start is not None else {'period': period}
+        raw = yf.download(symbols, group_by='ticker', auto_adjust=True,
+                          threads=True, progress=False, **window)
+        if raw is None or raw.empty:
+            return {}
+        
+        frames = {}
+        for symbol in symbols:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if symbol not in raw.columns.get_level_values(0):
+                    continue
+                data = raw[symbol]
+            else:
+                data = raw
+            data = data.dropna(how='all')
+            if len(data) > 0:
+                frames[symbol] = data
+        return frames
+    
+    def history(self, symbol: str, period='1y', start=None):
+        """One symbol, trying Yahoo's dash form for class shares (BRK.B -> BRK-B)"""
+        candidates = [symbol]
+        if '.' in symbol:
+            candidates.append(symbol.replace('.', '-'))
+        
+        error = None
+        for candidate in candidates:
+            try:
+                if start is not None:
+                    data = yf.Ticker(candidate).history(start=start)
+                else:
+                    data = yf.Ticker(candidate).history(period=period)
+            except Exception as e:
+                error = e
+                continue
+            if len(data) > 0:
+                return data
+        if error is not None:
+            raise error
+        return None
+    
+    def info(self, symbol: str) -> dict:
+        return yf.Ticker(symbol).info
+    
+    def news(self, symbol: str) -> list:
+        return yf.Ticker(symbol).news
+
+class LocalDirectoryProvider(DataProvider):
+    """Data read from a directory, at disk speed and without network
+    
+    Layout (one file per symbol):
+        <path>/history/<SYMBOL>.csv   Date index + Open, High, Low, Close, Volume
+                                      (or .parquet; needs pyarrow or fastparquet)
+        <path>/info/<SYMBOL>.json     Ticker.info-style dict
+        <path>/news/<SYMBOL>.json     list of {"title": ...} articles
+    
+    `period` is counted back from a symbol's last bar rather than from
+    today, so old recordings still give a full window.
+    """
+    
+    name = 'local'
+    PERIOD_UNITS = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+    
+    def __init__(self, path='market_data', file_format='csv'):
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"file_format must be 'csv' or 'parquet', not {file_format!r}")
+        self.path = path
+        self.file_format = file_format
+    
+    def _file(self, kind: str, symbol: str, ext: str) -> str:
+        return os.path.join(self.path, kind, f"{symbol.replace('/', '_')}.{ext}")
+    
+    def history(self, symbol: str, period='1y', start=None):
+        data = None
+        for ext in (self.file_format, 'parquet' if self.file_format == 'csv' else 'csv'):
+            file_path = self._file('history', symbol, ext)
+            if os.path.exists(file_path):
+                if ext == 'csv':
+                    data = pd.read_csv(file_path, index_col=0, parse_dates=True,
+                                       float_precision='round_trip')
+                else:
+                    data = pd.read_parquet(file_path)
+                break
+        if data is None or len(data) == 0:
+            return None
+        
+        if start is not None:
+            data = data[data.index >= pd.Timestamp(start)]
+        else:
+            cutoff = self._period_start(data.index[-1], period)
+            if cutoff is not None:
+                data = data[data.index > cutoff]
+        return data if len(data) > 0 else None
+    
+    @classmethod
+    def _period_start(cls, last: pd.Timestamp, period: str):
+        """'1y', '6mo', '5d'... before `last`; None for 'max'"""
+        for suffix, unit in cls.PERIOD_UNITS.items():
+            if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+                return last - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+        return None
+    
+    def _read_json(self, kind: str, symbol: str, default):
+        file_path = self._file(kind, symbol, 'json')
+        if not os.path.exists(file_path):
+            return default
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    
+    def info(self, symbol: str) -> dict:
+        return self._read_json('info', symbol, {})
+    
+    def news(self, symbol: str) -> list:
+        return self._read_json('news', symbol, [])
+
+class RecordingProvider(LocalDirectoryProvider):
+    """Pass calls through to `upstream` and save every response to `path`
+    
+    Price history is merged into the recorded file, so incremental
+    downloads extend it. Point a LocalDirectoryProvider (data_provider
+    'replay') at the same directory to play the recording back.
+    """
+    
+    name = 'record'
+    
+    def __init__(self, upstream: DataProvider, path='market_data', file_format='csv'):
+        super().__init__(path, file_format)
+        self.upstream = upstream
+        self._lock = threading.Lock()
+        for kind in ('history', 'info', 'news'):
+            os.makedirs(os.path.join(path, kind), exist_ok=True)
+    
+    def download(self, symbols: list, period='1y', start=None) -> dict:
+        frames = self.upstream.download(symbols, period=period, start=start)
+        for symbol, data in frames.items():
+            self._record_history(symbol, data)
+        return frames
+    
+    def history(self, symbol: str, period='1y', start=None):
+        data = self.upstream.history(symbol, period=period, start=start)
+        if data is not None and len(data) > 0:
+            self._record_history(symbol, data)
+        return data
+    
+    def info(self, symbol: str) -> dict:
+        info = self.upstream.info(symbol)
+        self._write(self._file('info', symbol, 'json'), lambda f: json.dump(info, f, default=str))
+        return info
+    
+    def news(self, symbol: str) -> list:
+        news = self.upstream.news(symbol)
+        self._write(self._file('news', symbol, 'json'), lambda f: json.dump(news, f, default=str))
+        return news
+    
+    def _record_history(self, symbol: str, data: pd.DataFrame):
+        data = data[[c for c in PriceStore.COLUMNS if c in data.columns]]
+        if data.index.tz is not None:
+            data = data.tz_localize(None)
+        with self._lock:
+            recorded = LocalDirectoryProvider.history(self, symbol, period='max')
+            if recorded is not None:
+                data = pd.concat([recorded, data])
+                data = data[~data.index.duplicated(keep='last')].sort_index()
+            file_path = self._file('history', symbol, self.file_format)
+            if self.file_format == 'csv':
+                self._write(file_path, lambda f: data.to_csv(f, index_label='Date'), mode='w')
+            else:
+                self._write(file_path, data.to_parquet, mode='wb')
+    
+    @staticmethod
+    def _write(file_path: str, dump, mode='w'):
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, mode) as f:
+            dump(f)
+        os.replace(tmp_path, file_path)
+
+def make_data_provider(config: dict) -> DataProvider:
+    """Backend named by `data_provider`: yahoo, local, record or replay"""
+    kind = config.get('data_provider', 'yahoo')
+    path = config.get('data_dir', 'market_data')
+    file_format = config.get('data_format', 'csv')
+    
+    if kind == 'yahoo':
+        return YahooProvider()
+    if kind in ('local', 'replay'):
+        return LocalDirectoryProvider(path, file_format)
+    if kind == 'record':
+        return RecordingProvider(YahooProvider(), path, file_format)
+    raise ValueError(f"Unknown data_provider {kind!r} (expected yahoo, local, record or replay)")
+
 # ============================================================================
 # NEWS SENTIMENT ANALYZER (Simple version using Yahoo Finance news)
 # ============================================================================
 
 class NewsSentimentAnalyzer:
-    """Analyze news sentiment for stocks"""
+    """Analyze news sentiment for stocks
     
-    @staticmethod
-    def get_sentiment(symbol: str) -> dict:
+    Results are kept in memory for `ttl_minutes`, so a warmup run (or a
+    repeat request for the same stock) does not refetch headlines.
+    """
+    
+    def __init__(self, ttl_minutes=30, provider: DataProvider = None):
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.provider = provider or YahooProvider()
+        self._cache = {}  # symbol -> (fetched_at, sentiment)
+        self._lock = threading.Lock()
+    
+    def get_sentiment(self, symbol: str) -> dict:
+        with self._lock:
+            cached = self._cache.get(symbol)
+        fresh = cached is not None and datetime.now() - cached[0] < self.ttl
+        metrics.cache('news', fresh)
+        if fresh:
+            return cached[1]
+        
+        with metrics.time('news'):
+            sentiment = self._fetch_sentiment(symbol)
+        if 'error' in sentiment:
+            metrics.error('news')
+        else:
+            with self._lock:
+                self._cache[symbol] = (datetime.now(), sentiment)
+        return sentiment
+    
+    def _fetch_sentiment(self, symbol: str) -> dict:
         try:
-            ticker = yf.Ticker(symbol)
-            news = ticker.news
+            news = self.provider.news(symbol)
             
             if not news:
                 return {'sentiment': 'neutral', 'score': 0, 'news_count': 0}
@@ -438,23 +1797,23 @@ class PredictionEngine:
     """Generate price predictions using technical analysis and momentum"""
     
     @staticmethod
-    def predict_targets(data: pd.DataFrame, factors: dict, regime: str) -> dict:
-        """Predict price targets for multiple timeframes"""
+    @metrics.timed('predict_targets')
+    def predict_targets(data: pd.DataFrame, factors: dict, regime: str, atr: float = None,
+                        ctx: IndicatorContext = None) -> dict:
+        """Predict price targets for multiple timeframes (pass `atr` to reuse a streamed ATR-14)"""
         
         if len(data) < 60 or not factors:
             return None
         
-        current_price = float(data['Close'].iloc[-1])
+        ctx = ctx or IndicatorContext(data)
+        current_price = ctx.price()
         volatility = factors['volatility']['20d']
         momentum_1m = factors['momentum']['1m']
         rsi = factors['rsi']
         
         # Calculate ATR (Average True Range) for realistic price movement
-        high_low = data['High'] - data['Low']
-        high_close = abs(data['High'] - data['Close'].shift())
-        low_close = abs(data['Low'] - data['Close'].shift())
-        tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        atr = tr.rolling(14).mean().iloc[-1]
+        if atr is None:
+            atr = ctx.atr(14)
         
         # DAMPENED predictions - more conservative
         # Cap momentum to prevent unrealistic extrapolation
@@ -598,6 +1957,607 @@ class PredictionEngine:
             'detailed_explanation': '\n'.join(prediction_explanation)
         }
 
+# ============================================================================
+# PROCESS POOL SCORING (Shared-memory price panels)
+# ============================================================================
+
+class SharedPricePanel:
+    """A right-aligned OHLCV panel placed in shared memory for worker processes
+
+    Workers attach by name and read their slice of symbols directly, so the
+    only data pickled per task is the block name, shape and a few indices.
+    """
+    
+    def __init__(self, frames: dict):
+        panel = PanelFactorEngine.build_panel(frames)
+        self.symbols = panel['symbols']
+        self.lengths = panel['lengths'].tolist()
+        stacked = np.stack([panel[col] for col in PanelFactorEngine.COLUMNS])
+        self.shape = stacked.shape
+        
+        self.shm = shared_memory.SharedMemory(create=True, size=max(stacked.nbytes, 1))
+        view = np.ndarray(self.shape, dtype='float64', buffer=self.shm.buf)
+        view[:] = stacked
+        del view
+    
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _score_shared_chunk(shm_name: str, shape: tuple, symbols: list, lengths: list,
+                        start: int, regime: str) -> list:
+    """Worker: run the per-symbol factor path for columns start..start+len(symbols)"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    results = []
+    try:
+        panel = np.ndarray(shape, dtype='float64', buffer=shm.buf)
+        depth = shape[1]
+        for offset, (symbol, length) in enumerate(zip(symbols, lengths)):
+            # Copy out this symbol's bars so no view into the block outlives it
+            values = np.array(panel[:, depth - length:, start + offset].T)
+            data = pd.DataFrame(values, columns=PanelFactorEngine.COLUMNS)
+            factors = MultiFactorAnalyzer.calculate_factors(data, symbol)
+            if not factors:
+                results.append(None)
+            else:
+                results.append((factors, MultiFactorAnalyzer.composite_score(factors, regime)))
+        del panel
+    finally:
+        shm.close()
+    return results
+
+# ============================================================================
+# PRICE DATA FETCHER (Batched downloads)
+# ============================================================================
+
+class PriceDataFetcher:
+    """Download daily OHLCV for many symbols in grouped requests"""
+
+    def __init__(self, period='1y', batch_size=100, provider: DataProvider = None):
+        self.period = period
+        self.batch_size = batch_size
+        self.provider = provider or YahooProvider()
+
+    def fetch(self, symbols: list, start=None) -> dict:
+        """Return {symbol: DataFrame} for every symbol that has data
+
+        With `start` only bars from that date on are requested, otherwise the
+        full `period`.
+        """
+        symbols = list(dict.fromkeys(symbols))  # Dedupe, keep order
+        frames = {}
+
+        for i in range(0, len(symbols), self.batch_size):
+            frames.update(self._download_batch(symbols[i:i + self.batch_size], start))
+
+        # Per-symbol fallback only for tickers the batch missed (e.g. BRK.B)
+        missing = [s for s in symbols if s not in frames]
+        for symbol in missing:
+            data = self.fetch_single(symbol, start)
+            if data is not None:
+                frames[symbol] = data
+
+        return frames
+
+    def _download_batch(self, symbols: list, start=None) -> dict:
+        try:
+            with metrics.time('download'):
+                return self.provider.download(symbols, period=self.period, start=start)
+        except Exception as e:
+            print(f"Batch download failed ({len(symbols)} symbols): {e}")
+            return {}
+
+    def fetch_single(self, symbol: str, start=None):
+        """Fetch one symbol on its own (None if the provider has no data)"""
+        try:
+            with metrics.time('history'):
+                data = self.provider.history(symbol, period=self.period, start=start)
+        except Exception as e:
+            print(f"Error downloading {symbol}: {e}")
+            return None
+        if data is None or len(data) == 0:
+            return None
+        return data
+
+# ============================================================================
+# PRICE STORE (On-disk OHLCV cache)
+# ============================================================================
+
+class PriceStore:
+    """Columnar on-disk store of daily OHLCV, one .npz file per symbol
+
+    Each file holds the bar dates plus one float64 array per column and the
+    date the symbol was last checked against Yahoo. Symbols already checked
+    today are served without any network call; stale symbols only download
+    bars from their last stored date onwards and merge them in.
+
+    Loaded symbols stay in memory as DataFrames, or with `compact` as a
+    float32 bars x columns array plus int32 day numbers (about a third of
+    the size); a DataFrame is then rebuilt on each request and only lives
+    as long as the caller holds it. `release_memory()` drops them all.
+    """
+
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, path='price_cache', fetcher: PriceDataFetcher = None, history_days=365,
+                 compact=False):
+        self.path = path
+        self.fetcher = fetcher or PriceDataFetcher()
+        self.history_days = history_days
+        self.compact = compact
+        self._frames = {}   # symbol -> DataFrame, or (days, values) when compact
+        self._checked = {}  # symbol -> 'YYYY-MM-DD' of last network check
+        os.makedirs(self.path, exist_ok=True)
+
+    def _remember(self, symbol: str, data: pd.DataFrame):
+        if not self.compact:
+            self._frames[symbol] = data
+            return
+        days = data.index.values.astype('datetime64[D]').astype('int32')
+        self._frames[symbol] = (days, data[self.COLUMNS].to_numpy(dtype='float32'))
+
+    def _recall(self, symbol: str):
+        entry = self._frames.get(symbol)
+        if entry is None or not self.compact:
+            return entry
+        days, values = entry
+        index = pd.DatetimeIndex(days.astype('datetime64[D]').astype('datetime64[ns]'))
+        return pd.DataFrame(values.astype('float64'), index=index, columns=self.COLUMNS)
+
+    def release_memory(self):
+        """Forget every in-memory frame; later requests read the files again"""
+        self._frames = {}
+
+    def dollar_volume(self, symbol: str, days=20):
+        """Average Close x Volume over the last `days` stored bars, or None
+
+        Reads memory or the symbol's file only, never the network, and
+        does not keep what it reads.
+        """
+        entry = self._frames.get(symbol)
+        if entry is not None and self.compact:
+            close, volume = entry[1][-days:, 3], entry[1][-days:, 4]
+        elif entry is not None:
+            close, volume = entry['Close'].to_numpy()[-days:], entry['Volume'].to_numpy()[-days:]
+        else:
+            file_path = self._file(symbol)
+            if not os.path.exists(file_path):
+                return None
+            try:
+                with np.load(file_path) as stored:
+                    close, volume = stored['Close'][-days:], stored['Volume'][-days:]
+            except Exception:
+                return None
+
+        traded = close.astype('float64') * volume
+        traded = traded[np.isfinite(traded)]
+        return float(traded.mean()) if len(traded) else None
+
+    def _file(self, symbol: str) -> str:
+        return os.path.join(self.path, f"{symbol.replace('/', '_')}.npz")
+
+    def load(self, symbol: str):
+        """Return the stored frame for a symbol (memory first, then disk)"""
+        if symbol in self._frames:
+            return self._recall(symbol)
+
+        file_path = self._file(symbol)
+        if not os.path.exists(file_path):
+            return None
+
+        try:
+            with np.load(file_path) as stored:
+                index = pd.DatetimeIndex(stored['index'].astype('datetime64[ns]'))
+                data = pd.DataFrame({col: stored[col] for col in self.COLUMNS}, index=index)
+                checked = str(stored['checked'])
+        except Exception as e:
+            print(f"Error reading price store for {symbol}: {e}")
+            return None
+
+        self._remember(symbol, data)
+        self._checked[symbol] = checked
+        return self._recall(symbol)
+
+    def save(self, symbol: str, data: pd.DataFrame, checked: str):
+        """Write a symbol's frame atomically and keep it in memory"""
+        self._remember(symbol, data)
+        self._checked[symbol] = checked
+
+        arrays = {col: data[col].to_numpy(dtype='float64') for col in self.COLUMNS}
+        arrays['index'] = data.index.values.astype('datetime64[ns]').astype('int64')
+        arrays['checked'] = np.array(checked)
+
+        file_path = self._file(symbol)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, file_path)
+
+    def get_history(self, symbols: list) -> dict:
+        """Return {symbol: DataFrame}, fetching only what is missing or stale"""
+        today = datetime.now().date().isoformat()
+        symbols = list(dict.fromkeys(symbols))
+
+        frames = {}
+        missing = []
+        stale = {}  # start date -> [symbols]
+        for symbol in symbols:
+            data = frames[symbol] = self.load(symbol)
+            if data is None or len(data) == 0:
+                missing.append(symbol)
+            elif self._checked.get(symbol) != today:
+                start = data.index[-1].date().isoformat()
+                stale.setdefault(start, []).append(symbol)
+            metrics.cache('price', data is not None and self._checked.get(symbol) == today)
+
+        if missing:
+            fetched = self.fetcher.fetch(missing)
+            for symbol, data in fetched.items():
+                frames[symbol] = self._normalize(data)
+                self.save(symbol, frames[symbol], today)
+
+        for start, group in stale.items():
+            fetched = self.fetcher.fetch(group, start=start)
+            for symbol in group:
+                data = frames[symbol]
+                if symbol in fetched:
+                    data = frames[symbol] = self._merge(data, self._normalize(fetched[symbol]))
+                self.save(symbol, data, today)
+
+        if self.compact:
+            # Hand out what later requests will see, not the unrounded originals
+            return {s: self._recall(s) for s in symbols if s in self._frames}
+        return {s: data for s, data in frames.items() if data is not None}
+
+    def _normalize(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Keep OHLCV columns on a tz-naive daily index"""
+        data = data[self.COLUMNS].astype('float64')
+        index = pd.DatetimeIndex(data.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        data.index = index.normalize()
+        return data
+
+    def _merge(self, old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+        """Append new bars (replacing a partial last bar) and trim to the window"""
+        data = pd.concat([old, new])
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        cutoff = data.index[-1] - timedelta(days=self.history_days)
+        return data[data.index > cutoff]
+
+# ============================================================================
+# METADATA CACHE (Company name / sector)
+# ============================================================================
+
+class MetadataCache:
+    """Persistent cache of company name and sector from Ticker.info
+
+    Entries younger than `ttl_days` are served as-is. Expired entries are
+    still served, and a background thread refreshes them, so only symbols
+    never seen before ever wait on an `info` request.
+    """
+
+    def __init__(self, path='metadata_cache.json', ttl_days=30, provider: DataProvider = None):
+        self.path = path
+        self.ttl = timedelta(days=ttl_days)
+        self.provider = provider or YahooProvider()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._entries = {}
+        self._dirty = False
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._worker = None
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                print(f"Error reading metadata cache: {e}")
+
+    def get(self, symbol: str) -> dict:
+        """Return {'company_name', 'sector'} for a symbol"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        metrics.cache('metadata', entry is not None)
+
+        if entry is None:
+            entry = self._fetch(symbol)
+            if entry is None:
+                return {'company_name': symbol, 'sector': 'Unknown'}
+        elif datetime.now() - datetime.fromisoformat(entry['fetched_at']) > self.ttl:
+            self._refresh_in_background(symbol)
+
+        return {'company_name': entry['company_name'], 'sector': entry['sector']}
+
+    def _fetch(self, symbol: str):
+        try:
+            with metrics.time('info'):
+                info = self.provider.info(symbol)
+        except Exception as e:
+            print(f"Error fetching info for {symbol}: {e}")
+            return None
+
+        entry = {
+            'company_name': info.get('longName', symbol),
+            'sector': info.get('sector', 'Unknown'),
+            'fetched_at': datetime.now().isoformat()
+        }
+        with self._lock:
+            self._entries[symbol] = entry
+            self._dirty = True
+        return entry
+
+    def _refresh_in_background(self, symbol: str):
+        with self._lock:
+            if symbol in self._pending:
+                return
+            self._pending.add(symbol)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._refresh_loop, daemon=True)
+                self._worker.start()
+        self._queue.put(symbol)
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                symbol = self._queue.get(timeout=5)
+            except queue.Empty:
+                self.flush()
+                return
+            self._fetch(symbol)
+            with self._lock:
+                self._pending.discard(symbol)
+            if self._queue.empty():
+                self.flush()
+
+    def flush(self):
+        """Write the cache to disk if anything changed"""
+        # The refresh thread and run_analysis can both flush; serialize writers
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = dict(self._entries)
+                self._dirty = False
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+
+# ============================================================================
+# RESULT RANKING (Bounded top-K)
+# ============================================================================
+
+class TopKRanker:
+    """Stream scored stocks, keeping full detail only for the best K
+
+    Every stock also gets a compact summary row, so memory for a run grows
+    with K plus a few numbers per symbol rather than with full analyses.
+    Ties keep arrival order, matching a stable descending sort.
+    """
+    
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []  # (score, -seq, analysis); the root is the weakest kept
+        self._rows = []
+        self._seq = 0
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def push(self, analysis: dict, sector: str = None) -> dict:
+        """Rank one analysis and return its summary row"""
+        row = self.summarize(analysis, sector)
+        self._rows.append(row)
+        entry = (analysis['score'], -self._seq, analysis)
+        self._seq += 1
+        
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+        return row
+    
+    def top(self) -> list:
+        """Full analyses of the best K, best first"""
+        return [entry[2] for entry in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+    
+    def summary(self) -> list:
+        """Compact rows for every stock, best first"""
+        scores = np.array([row['score'] for row in self._rows])
+        order = np.argsort(-scores, kind='stable')
+        return [self._rows[i] for i in order]
+    
+    @staticmethod
+    def summarize(analysis: dict, sector: str = None) -> dict:
+        factors = analysis['factors']
+        return {
+            'symbol': analysis['symbol'],
+            'sector': sector,
+            'score': analysis['score'],
+            'current_price': analysis['current_price'],
+            'rsi': factors['rsi'],
+            'momentum_1m': factors['momentum']['1m'],
+            'momentum_3m': factors['momentum']['3m'],
+            'volatility_20d': factors['volatility']['20d'],
+            'trend_score': factors['trend']['score'],
+            'volume_surge': factors['volume']['surge'],
+            'macd_crossover': factors['macd']['crossover'],
+            'bollinger_signal': factors['bollinger']['signal']
+        }
+
+# ============================================================================
+# DERIVED RESULT CACHE (Skip re-scoring unchanged symbols)
+# ============================================================================
+
+class DerivedResultCache:
+    """Analyses keyed by everything they were computed from
+
+    The key is (last bar timestamp, last close, last volume, regime,
+    scoring-config hash), so a symbol whose newest bar, the market regime
+    and the scoring settings are all unchanged gets its previous analysis
+    back instead of being re-scored. Enrichment (news in particular) is
+    only reused for `enrichment_ttl_minutes` after its `enriched_at`;
+    after that a hit comes back as the phase-1 analysis and is enriched
+    again.
+
+    With `compact` (memory-bounded mode) entries are kept marshalled,
+    about a fifth of the size of the dicts, and each hit is a fresh copy.
+    """
+
+    # Settings that change the prices scored or how they are scored
+    CONFIG_KEYS = ('factor_engine', 'data_provider', 'data_dir', 'data_format', 'price_cache_dir')
+    ENRICHMENT_FIELDS = ('company_name', 'sector', 'patterns', 'news', 'predictions', 'enriched_at')
+
+    def __init__(self, enrichment_ttl_minutes=30, compact=False):
+        self.enrichment_ttl = timedelta(minutes=enrichment_ttl_minutes)
+        self.compact = compact
+        self._entries = {}  # symbol -> (key, analysis dict or marshalled analysis)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def config_hash(cls, config: dict) -> str:
+        scoring = {key: config.get(key) for key in cls.CONFIG_KEYS}
+        # Any memory limit stores float32 prices, which score slightly differently
+        scoring['compact_prices'] = bool(config.get('memory_limit_mb'))
+        return hashlib.sha1(json.dumps(scoring, sort_keys=True).encode()).hexdigest()[:12]
+
+    @staticmethod
+    def key(data: pd.DataFrame, regime: str, config_hash: str) -> tuple:
+        last = data.iloc[-1]
+        return (pd.Timestamp(data.index[-1]).isoformat(), float(last['Close']),
+                float(last['Volume']), regime, config_hash)
+
+    def get(self, symbol: str, key: tuple):
+        """Cached analysis for symbol if its key still matches, else None"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+            hit = entry is not None and entry[0] == key
+            metrics.cache('derived', hit)
+            if not hit:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+            analysis = entry[1]
+            if isinstance(analysis, bytes):
+                analysis = marshal.loads(analysis)
+            # Enrichment happens after put, so its age comes from the analysis
+            enriched_at = analysis.get('enriched_at')
+            if analysis.get('enriched') and (
+                    enriched_at is None
+                    or datetime.now() - datetime.fromisoformat(enriched_at) > self.enrichment_ttl):
+                # Fresh copy: earlier results may still hold the enriched dict
+                analysis = {k: v for k, v in analysis.items() if k not in self.ENRICHMENT_FIELDS}
+                analysis['enriched'] = False
+                self._entries[symbol] = (key, self._pack(analysis))
+            return analysis
+
+    def put(self, symbol: str, key: tuple, analysis: dict):
+        with self._lock:
+            self._entries[symbol] = (key, self._pack(analysis))
+
+    def refresh(self, symbol: str, analysis: dict):
+        """Store an analysis enriched after put (compact entries are copies)"""
+        if not self.compact:
+            return
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                self._entries[symbol] = (entry[0], self._pack(analysis))
+
+    def _pack(self, analysis: dict):
+        if self.compact:
+            try:
+                return marshal.dumps(analysis)
+            except ValueError:  # Not plain data: keep the dict
+                pass
+        return analysis
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+# ============================================================================
+# RESULTS STORE (Completed runs in SQLite, shared across processes)
+# ============================================================================
+
+class ResultsStore:
+    """The last few completed runs, readable from any process
+
+    run_analysis saves every run as one row. Readers poll `latest_id()`, a
+    single primary-key lookup, and only load and parse a payload when a
+    newer run has landed. WAL mode lets readers proceed while a run is
+    being written.
+    """
+
+    def __init__(self, path='results.db', keep=10):
+        self.path = path
+        self.keep = keep
+        self._local = threading.local()  # One read connection per thread
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._execute('PRAGMA journal_mode=WAL')
+        self._execute(
+            'CREATE TABLE IF NOT EXISTS runs ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'timestamp TEXT NOT NULL, '
+            'version TEXT NOT NULL, '
+            'payload TEXT NOT NULL)'
+        )
+
+    def _execute(self, sql, params=()):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _read(self, sql, params=()):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+        return conn.execute(sql, params).fetchall()
+
+    def save(self, results: dict) -> int:
+        """Store a run's results and return its run ID"""
+        payload = json.dumps(results, default=str)
+        version = hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                run_id = conn.execute(
+                    'INSERT INTO runs (timestamp, version, payload) VALUES (?, ?, ?)',
+                    (results.get('timestamp', datetime.now().isoformat()), version, payload)
+                ).lastrowid
+                conn.execute('DELETE FROM runs WHERE id <= ?', (run_id - self.keep,))
+        finally:
+            conn.close()
+        return run_id
+
+    def latest_id(self):
+        """ID of the newest run (or None)"""
+        return self._read('SELECT MAX(id) FROM runs')[0][0]
+
+    def load(self, run_id=None):
+        """Return (run_id, version, results) for a run (default newest), or None"""
+        if run_id is None:
+            rows = self._read('SELECT id, version, payload FROM runs ORDER BY id DESC LIMIT 1')
+        else:
+            rows = self._read('SELECT id, version, payload FROM runs WHERE id = ?', (run_id,))
+        if not rows:
+            return None
+        run_id, version, payload = rows[0]
+        return run_id, version, json.loads(payload)
+
 # ============================================================================
 # LIVE TRADING ANALYZER (Main Engine)
 # ============================================================================
@@ -605,14 +2565,135 @@ class PredictionEngine:
 class LiveTradingAnalyzer:
     """Main analysis engine for live trading"""
     
-    def __init__(self, config):
+    BUDGET_BATCH_SIZE = 50         # Symbols downloaded and scored per step under a time budget
+    BUDGET_ENRICHMENT_SHARE = 0.3  # Share of a time budget held back for enrichment
+    # Settings a running analysis can pick up mid-run (see update_config)
+    IMMEDIATE_CONFIG_KEYS = ('capital', 'position_size_pct', 'stop_loss_pct', 'take_profit_pct',
+                             'results_store_file')
+    
+    def __init__(self, config, provider: DataProvider = None):
+        """`provider` overrides the config's data_provider (e.g. a test stub)"""
         self.config = config
+        self.data_provider = provider or make_data_provider(config)
         self.regime_detector = RegimeDetector()
         self.factor_analyzer = MultiFactorAnalyzer()
         self.pattern_detector = CandlestickPatternDetector()
-        self.news_analyzer = NewsSentimentAnalyzer()
         self.prediction_engine = PredictionEngine()
+        self._process_pool = None
+        self._process_workers = 0
+        self.results_store = ResultsStore(config.get('results_store_file', 'results.db'))
+        self.derived_cache = DerivedResultCache()
+        self._config_lock = threading.Lock()
+        self._active_runs = 0
+        self._pending_config = None  # Applied when the last running analysis ends
+        
+        self._setup_universe()
+        self._setup_scoring()
+        self._setup_enrichment()
+    
+    def _setup_universe(self):
+        """Price download and storage"""
+        self.price_fetcher = PriceDataFetcher(
+            batch_size=self.config.get('download_batch_size', 100),
+            provider=self.data_provider
+        )
+        self.price_store = PriceStore(
+            path=self.config.get('price_cache_dir', 'price_cache'),
+            fetcher=self.price_fetcher,
+            compact=bool(self.config.get('memory_limit_mb'))
+        )
+        self.derived_cache.compact = bool(self.config.get('memory_limit_mb'))
+        self.indicator_states = IndicatorStateStore(
+            path=os.path.join(self.price_store.path, 'indicator_state.json')
+        )
+    
+    def _setup_scoring(self):
+        """Factor engine and workers; cached analyses from another engine stop matching"""
+        workers = int(self.config.get('process_workers') or os.cpu_count() or 1)
+        if workers != self._process_workers:
+            self.close()  # Restarts lazily with the new worker count
+        self.scoring_hash = DerivedResultCache.config_hash(self.config)
+    
+    def _setup_enrichment(self):
+        """News, company info and how long enriched analyses are reused"""
+        self.news_analyzer = NewsSentimentAnalyzer(
+            ttl_minutes=self.config.get('news_ttl_minutes', 30),
+            provider=self.data_provider
+        )
+        self.metadata_cache = MetadataCache(
+            path=self.config.get('metadata_cache_file', 'metadata_cache.json'),
+            ttl_days=self.config.get('metadata_ttl_days', 30),
+            provider=self.data_provider
+        )
+        self.derived_cache.enrichment_ttl = timedelta(minutes=self.config.get('news_ttl_minutes', 30))
+    
+    def update_config(self, config: dict) -> set:
+        """Apply config changes, rebuilding only the stages whose settings changed
+        
+        `config` may be partial; it is merged over the current config.
+        Returns the changed stages (see CONFIG_STAGES). Sizing needs no
+        rebuild: format_recommendation reads it from self.config. A new
+        data provider feeds both the universe and enrichment stages.
+        
+        While an analysis is running, sizing and the results store apply
+        at once and the rest is queued until the run ends, so the run
+        never sees its price store or worker pool replaced.
+        """
+        with self._config_lock:
+            config = {**(self._pending_config or self.config), **config}
+            stages = self._config_stages(config)
+            if not self._active_runs:
+                self._apply_config(config, stages)
+                return stages
+            self._pending_config = config
+            self.config = {**self.config, **{key: config.get(key) for key in self.IMMEDIATE_CONFIG_KEYS}}
+            self._set_results_store()
+            return stages
+    
+    def _config_stages(self, config: dict) -> set:
+        stages = changed_config_stages(self.config, config)
+        if DerivedResultCache.config_hash(config) != self.scoring_hash:
+            stages.add('scoring')  # Cached analyses were scored from other prices
+        if 'data' in stages:
+            stages |= {'universe', 'enrichment'}
+        return stages
+    
+    def _apply_config(self, config: dict, stages: set):
+        """Rebuild `stages` for `config` (caller holds _config_lock, no run active)"""
+        self.config = config
         
+        if 'data' in stages:
+            self.data_provider = make_data_provider(config)
+        if 'universe' in stages:
+            self.indicator_states.flush()
+            self._setup_universe()
+        if 'scoring' in stages:
+            self._setup_scoring()
+        if 'enrichment' in stages:
+            self.metadata_cache.flush()
+            self._setup_enrichment()
+        self._set_results_store()
+    
+    def _set_results_store(self):
+        path = self.config.get('results_store_file', 'results.db')
+        if path != self.results_store.path:
+            self.results_store = ResultsStore(path)
+    
+    def _finish_run(self):
+        """Apply config changes queued while analyses were running"""
+        with self._config_lock:
+            self._active_runs -= 1
+            if self._active_runs or self._pending_config is None:
+                return
+            config, self._pending_config = self._pending_config, None
+            self._apply_config(config, self._config_stages(config))
+    
+    def release_memory(self):
+        """Drop in-memory prices and cached analyses (both are rebuilt on demand)"""
+        self.price_store.release_memory()
+        self.derived_cache.clear()
+        gc.collect()
+    
     def get_sector_stocks(self, enabled_sectors=None):
         """Get stocks from enabled sectors"""
         if enabled_sectors is None:
@@ -625,63 +2706,335 @@ class LiveTradingAnalyzer:
         
         return stocks
     
-    def analyze_stock(self, symbol: str, spy_regime: dict) -> dict:
-        """Complete analysis for a single stock"""
+    @metrics.timed('score_stock')
+    def score_stock(self, symbol: str, spy_regime: dict, data: pd.DataFrame = None,
+                    ctx: IndicatorContext = None) -> dict:
+        """Phase 1: factors and composite score only (pass `data` to skip the download)"""
         
         try:
-            # Download data
-            stock = yf.Ticker(symbol)
-            data = stock.history(period='1y')
+            # Download data unless the batch stage already fetched it
+            if data is None:
+                data = self.price_fetcher.fetch_single(symbol)
             
-            if len(data) < 60:
+            if data is None or len(data) < 60:
                 return None
             
             # Calculate factors
-            factors = self.factor_analyzer.calculate_factors(data, symbol)
+            factors = self.factor_analyzer.calculate_factors(data, symbol, ctx=ctx)
             if not factors:
                 return None
             
             # Composite score
             score = self.factor_analyzer.composite_score(factors, spy_regime['regime'])
             
-            # Candlestick patterns
-            patterns = self.pattern_detector.detect_patterns(data)
-            
-            # News sentiment
-            news = self.news_analyzer.get_sentiment(symbol)
-            
-            # Predictions
-            predictions = self.prediction_engine.predict_targets(data, factors, spy_regime['regime'])
-            
-            # Get company info
-            info = stock.info
-            
             return {
                 'symbol': symbol,
-                'company_name': info.get('longName', symbol),
-                'sector': info.get('sector', 'Unknown'),
                 'current_price': float(data['Close'].iloc[-1]),
                 'score': score,
                 'factors': factors,
-                'patterns': patterns,
-                'news': news,
-                'predictions': predictions,
-                'regime': spy_regime['regime']
+                'regime': spy_regime['regime'],
+                'enriched': False
             }
             
         except Exception as e:
             print(f"Error analyzing {symbol}: {e}")
+            metrics.error('score_stock')
+            return None
+    
+    def score_panel(self, jobs: list, spy_regime: dict) -> list:
+        """Phase 1 for many stocks at once: [(symbol, data)] -> [analysis or None]"""
+        
+        try:
+            panel = PanelFactorEngine.build_panel({symbol: data for symbol, data in jobs})
+            table = PanelFactorEngine.calculate_factors(panel)
+            scores = PanelFactorEngine.composite_scores(table, spy_regime['regime']).tolist()
+            factors = PanelFactorEngine.to_factor_dicts(table)
+        except Exception as e:
+            print(f"Error scoring panel, falling back to per-symbol: {e}")
+            metrics.error('panel_factors')
+            return [self.score_stock(symbol, spy_regime, data=data) for symbol, data in jobs]
+        
+        position = {symbol: j for j, symbol in enumerate(table['symbols'])}
+        results = []
+        for symbol, _ in jobs:
+            if symbol not in factors:
+                results.append(None)
+                continue
+            results.append({
+                'symbol': symbol,
+                'current_price': factors[symbol]['price_levels']['current'],
+                'score': scores[position[symbol]],
+                'factors': factors[symbol],
+                'regime': spy_regime['regime'],
+                'enriched': False
+            })
+        return results
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Lazily start the CPU worker pool (kept for the analyzer's lifetime)"""
+        if self._process_pool is None:
+            workers = int(self.config.get('process_workers') or os.cpu_count() or 1)
+            # spawn, not fork: the web process already runs threads
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+            )
+            self._process_workers = workers
+        return self._process_pool
+    
+    def _reset_process_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool so the next run starts fresh workers"""
+        if self._process_pool is pool:
+            self._process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def close(self):
+        """Shut down background worker processes"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
+    
+    def score_processes(self, jobs: list, spy_regime: dict) -> list:
+        """Phase 1 on a process pool, reading prices from shared memory"""
+        
+        if not jobs:
+            return []
+        
+        pool = self._get_process_pool()
+        panel = SharedPricePanel({symbol: data for symbol, data in jobs})
+        scored = {}
+        failed = []
+        try:
+            # A few chunks per worker keeps them busy without per-symbol IPC
+            n = len(panel.symbols)
+            chunk = max(1, -(-n // (self._process_workers * 4)))
+            starts = list(range(0, n, chunk))
+            futures = {}
+            try:
+                for i in starts:
+                    futures[i] = pool.submit(_score_shared_chunk, panel.shm.name, panel.shape,
+                                             panel.symbols[i:i + chunk], panel.lengths[i:i + chunk],
+                                             i, spy_regime['regime'])
+            except RuntimeError as e:  # Broken, or shut down under us
+                print(f"Scoring pool is broken, scoring in-process: {e}")
+                metrics.error('process_scoring')
+                self._reset_process_pool(pool)
+            
+            for i in starts:
+                symbols = panel.symbols[i:i + chunk]
+                if i not in futures:
+                    failed.extend(symbols)
+                    continue
+                try:
+                    scored.update(zip(symbols, futures[i].result()))
+                except Exception as e:
+                    print(f"Error in scoring worker: {e}")
+                    metrics.error('process_scoring')
+                    if isinstance(e, BrokenProcessPool):
+                        self._reset_process_pool(pool)
+                    failed.extend(symbols)
+        finally:
+            panel.release()
+        
+        # Chunks a worker could not score are redone in this process
+        fallback = {}
+        if failed:
+            data_by_symbol = dict(jobs)
+            fallback = {symbol: self.score_stock(symbol, spy_regime, data=data_by_symbol[symbol])
+                        for symbol in failed}
+        
+        results = []
+        for symbol, _ in jobs:
+            if symbol in fallback:
+                results.append(fallback[symbol])
+                continue
+            if scored.get(symbol) is None:
+                results.append(None)
+                continue
+            factors, score = scored[symbol]
+            results.append({
+                'symbol': symbol,
+                'current_price': factors['price_levels']['current'],
+                'score': score,
+                'factors': factors,
+                'regime': spy_regime['regime'],
+                'enriched': False
+            })
+        return results
+    
+    def score_streaming(self, jobs: list, spy_regime: dict) -> list:
+        """Phase 1 from per-symbol indicator states, advancing only new bars"""
+        
+        results = []
+        for symbol, data in jobs:
+            try:
+                with metrics.time('streaming_factors'):
+                    factors = self.indicator_states.advance(symbol, data).factors()
+            except Exception as e:
+                print(f"Error analyzing {symbol}: {e}")
+                metrics.error('streaming_factors')
+                factors = None
+            
+            if not factors:
+                results.append(None)
+                continue
+            results.append({
+                'symbol': symbol,
+                'current_price': factors['price_levels']['current'],
+                'score': self.factor_analyzer.composite_score(factors, spy_regime['regime']),
+                'factors': factors,
+                'regime': spy_regime['regime'],
+                'enriched': False
+            })
+        return results
+    
+    @metrics.timed('enrich_stock')
+    def enrich_analysis(self, analysis: dict, data: pd.DataFrame = None,
+                        ctx: IndicatorContext = None) -> dict:
+        """Phase 2: add patterns, news, predictions and company info to a scored stock"""
+        
+        if analysis.get('enriched'):
+            return analysis
+        
+        symbol = analysis['symbol']
+        try:
+            if data is None:
+                data = self.price_store.load(symbol)
+            if data is None:
+                data = self.price_fetcher.fetch_single(symbol)
+            if data is None:
+                raise ValueError('no price history')
+            ctx = ctx or IndicatorContext(data)
+            
+            # Candlestick patterns
+            patterns = self.pattern_detector.detect_patterns(data)
+            
+            # News sentiment
+            news = self.news_analyzer.get_sentiment(symbol)
+            
+            # Predictions (reusing the streamed ATR when the state is current)
+            state = self.indicator_states.get(symbol)
+            atr = None
+            if state is not None and state.last_date == pd.Timestamp(data.index[-1]).isoformat():
+                atr = state.atr
+            predictions = self.prediction_engine.predict_targets(
+                data, analysis['factors'], analysis['regime'], atr=atr, ctx=ctx
+            )
+            
+            # Company info (cached, refreshed in the background once stale)
+            info = self.metadata_cache.get(symbol)
+            ctx.report()
+            
+        except Exception as e:
+            print(f"Error enriching {symbol}: {e}")
+            metrics.error('enrich_stock')
+            return None
+        
+        analysis.update({
+            'company_name': info['company_name'],
+            'sector': info['sector'],
+            'patterns': patterns,
+            'news': news,
+            'predictions': predictions,
+            'enriched': True,
+            'enriched_at': datetime.now().isoformat()
+        })
+        self.derived_cache.refresh(symbol, analysis)
+        return analysis
+    
+    @metrics.timed('analyze_stock')
+    def analyze_stock(self, symbol: str, spy_regime: dict, data: pd.DataFrame = None) -> dict:
+        """Complete analysis for a single stock (pass `data` to skip the download)"""
+        
+        if data is None:
+            data = self.price_store.get_history([symbol]).get(symbol)
+            if data is None:
+                return None
+        
+        key = self.derived_cache.key(data, spy_regime['regime'], self.scoring_hash)
+        analysis = self.derived_cache.get(symbol, key)
+        if analysis is not None:
+            return self.enrich_analysis(analysis, data=data)
+        
+        # One context so scoring and predictions share intermediates
+        ctx = IndicatorContext(data)
+        analysis = self.score_stock(symbol, spy_regime, data=data, ctx=ctx)
+        if analysis is None:
             return None
+        self.derived_cache.put(symbol, key, analysis)
+        return self.enrich_analysis(analysis, data=data, ctx=ctx)
     
-    def run_analysis(self, enabled_sectors=None, top_n=10):
-        """Run analysis on all stocks and return top opportunities"""
+    def run_analysis(self, enabled_sectors=None, top_n=10, progress_callback=None,
+                     time_budget=None):
+        """Run analysis on all stocks and return top opportunities
+        
+        `progress_callback`, if given, is called with an event dict as each
+        stage finishes ('regime', 'sector_scored', 'enriching',
+        'symbol_enriched', 'complete'). Every event carries `run_elapsed_ms`
+        plus the timing of the stage or symbol it reports.
+        
+        With `time_budget` (seconds) the run is "anytime": symbols are scored
+        in priority batches (see `priority_order`) until the scoring share of
+        the budget is spent, then finalists are enriched best first until
+        the budget runs out. Results are flagged `partial` when the budget
+        cut anything short; `coverage` says how much was done.
+        
+        Results also carry `timing`: wall time per phase plus calls, time,
+        errors and cache hit rates per stage from `metrics` over the run
+        (which includes anything else the process did meanwhile), and
+        `memory`: RSS per stage (see MemoryMonitor).
+        
+        With `memory_limit_mb` set the run is memory-bounded. Prices are
+        kept as compact float32 arrays. The universe is downloaded and
+        scored in chunks of `memory_chunk_size`, and each chunk's frames
+        are dropped once its factors are extracted. Above 80% of the limit
+        fewer jobs run at once; above the limit, cached prices and
+        analyses are released between chunks.
+        
+        Config changes made during the run are applied when it ends (see
+        update_config).
+        """
+        
+        with self._config_lock:
+            self._active_runs += 1
+        try:
+            return self._run_analysis(enabled_sectors, top_n, progress_callback, time_budget)
+        finally:
+            self._finish_run()
+    
+    def _run_analysis(self, enabled_sectors, top_n, progress_callback, time_budget):
+        run_start = time.perf_counter()
+        metrics_start = metrics.snapshot()
+        bounded = bool(self.config.get('memory_limit_mb'))
+        memory = MemoryMonitor(
+            limit_mb=self.config.get('memory_limit_mb', 0),
+            trace_allocations=self.config.get('memory_trace_allocations', False)
+        )
+        deadline = scoring_deadline = None
+        if time_budget:
+            deadline = run_start + time_budget
+            scoring_deadline = run_start + time_budget * (1 - self.BUDGET_ENRICHMENT_SHARE)
+        budget_hit = False
+        
+        def elapsed_ms(since):
+            return round((time.perf_counter() - since) * 1000, 2)
+        
+        def emit(event_type, **payload):
+            if progress_callback is not None:
+                try:
+                    progress_callback({'type': event_type, 'run_elapsed_ms': elapsed_ms(run_start), **payload})
+                except Exception as e:
+                    print(f"Progress callback failed: {e}")
         
         print("🔄 Analyzing market regime...")
         
         # Get SPY data for regime detection
-        spy = yf.Ticker('SPY')
-        spy_data = spy.history(period='1y')
-        spy_regime = self.regime_detector.detect_regime(spy_data)
+        with memory.stage('regime'):
+            spy_data = self.price_store.get_history(['SPY']).get('SPY', pd.DataFrame())
+            spy_regime = self.regime_detector.detect_regime(spy_data)
+            del spy_data
+        regime_ms = elapsed_ms(run_start)
+        metrics.observe('stage_seconds', regime_ms / 1000, stage='run_regime')
+        emit('regime', market_regime=spy_regime, elapsed_ms=regime_ms)
         
         print(f"📊 Market Regime: {spy_regime['regime'].upper()}")
         print(f"🌊 Volatility: {spy_regime['volatility']:.1%}\n")
@@ -689,37 +3042,379 @@ class LiveTradingAnalyzer:
         # Get stocks to analyze
         sector_stocks = self.get_sector_stocks(enabled_sectors)
         
-        all_analyses = []
+        ranker = TopKRanker(top_n)
         total_stocks = sum(len(stocks) for stocks in sector_stocks.values())
         
         print(f"🔍 Analyzing {total_stocks} stocks across {len(sector_stocks)} sectors...\n")
         
-        analyzed_count = 0
+        # Work units: whole sectors, or priority batches when racing a deadline
+        if time_budget:
+            order = self.priority_order(sector_stocks)
+            size = self.BUDGET_BATCH_SIZE
+            batches = [(f"Priority batch {k // size + 1}", order[k:k + size])
+                       for k in range(0, len(order), size)]
+            print(f"⏱️  Time budget {time_budget:.0f}s: scoring in {len(batches)} priority batches")
+        else:
+            batches = [(sector, stocks[:50]) for sector, stocks in sector_stocks.items()]  # Top 50 per sector
+        if bounded:
+            size = max(1, int(self.config.get('memory_chunk_size', 25)))
+            batches = [
+                (name if len(symbols) <= size else f"{name} ({k // size + 1})", symbols[k:k + size])
+                for name, symbols in batches for k in range(0, len(symbols), size)
+            ]
+            print(f"🧠 Memory limit {memory.limit_mb} MB: scoring in chunks of up to {size}")
+        # Universe sector of each symbol (batches may mix sectors)
+        symbol_sectors = {}
         for sector, stocks in sector_stocks.items():
-            print(f"  📁 Analyzing {sector}... ({len(stocks)} stocks)")
+            for symbol in stocks:
+                symbol_sectors.setdefault(symbol, sector)
+        attempted = set()
+        scored_symbols = set()
+        download_total_ms = score_total_ms = 0.0
+        
+        # Batch download: one grouped fetch for the whole universe or per batch
+        price_data = {}
+        prefetched = (self.config.get('download_scope', 'sector') == 'universe'
+                      and not time_budget and not bounded)
+        if prefetched:
+            universe = [s for stocks in sector_stocks.values() for s in stocks[:50]]
+            print(f"  📥 Downloading price history for {len(universe)} symbols...")
+            price_data = self.price_store.get_history(universe)
+        
+        workers = max(1, int(self.config.get('analysis_workers', 8)))
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        throttle = memory if bounded else None
+        
+        analyzed_count = 0
+        memory.start()
+        try:
+            for n, (sector, symbols) in enumerate(batches):
+                # The first batch is always scored; after it, only as many
+                # symbols as the time spent per symbol so far says still fit
+                if scoring_deadline is not None and n > 0:
+                    fit = self._symbols_that_fit(scoring_deadline, len(attempted),
+                                                 download_total_ms + score_total_ms)
+                    if fit == 0:
+                        print("  ⏱️  Scoring budget spent, skipping the remaining batches")
+                        budget_hit = True
+                        break
+                    if fit < len(symbols):
+                        print(f"  ⏱️  Scoring budget nearly spent, scoring {fit} more symbols")
+                        symbols = symbols[:fit]
+                        budget_hit = True
+                print(f"  📁 Analyzing {sector}... ({len(symbols)} stocks)")
+                attempted.update(symbols)
+                
+                stage_start = time.perf_counter()
+                if not prefetched:
+                    with memory.stage('prices'):
+                        price_data = self.price_store.get_history(symbols)
+                download_ms = elapsed_ms(stage_start)
+                download_total_ms += download_ms
+                metrics.observe('stage_seconds', download_ms / 1000, stage='run_prices')
+                
+                jobs = []
+                for symbol in symbols:
+                    data = price_data.get(symbol)
+                    if data is None:
+                        print(f"No price data for {symbol}, skipping")
+                        continue
+                    jobs.append((symbol, data))
+                
+                # Phase 1: score every symbol (results are slotted by position
+                # so output order never depends on which thread finishes first)
+                symbol_ms = {}
+                stage_start = time.perf_counter()
+                memory.begin('score')
+                
+                # Symbols whose last bar, regime and scoring config are
+                # unchanged reuse their previous analysis
+                keys = [self.derived_cache.key(data, spy_regime['regime'], self.scoring_hash)
+                        for _, data in jobs]
+                cached = [self.derived_cache.get(symbol, key) for (symbol, _), key in zip(jobs, keys)]
+                stale = [i for i, analysis in enumerate(cached) if analysis is None]
+                stale_jobs = [jobs[i] for i in stale]
+                
+                engine = self.config.get('factor_engine', 'panel')
+                batch_scorers = {
+                    'panel': self.score_panel,
+                    'streaming': self.score_streaming,
+                    'process': self.score_processes
+                }
+                if engine in batch_scorers:
+                    # Vectorized/batched engines only have an amortized per-symbol time
+                    batch = batch_scorers[engine](stale_jobs, spy_regime) if stale_jobs else []
+                    each_ms = elapsed_ms(stage_start) / max(len(stale_jobs), 1)
+                    completed = ((i, analysis, each_ms) for i, analysis in enumerate(batch))
+                else:
+                    completed = self._run_ordered(
+                        executor, self.score_stock,
+                        [(symbol, spy_regime, data) for symbol, data in stale_jobs],
+                        [symbol for symbol, _ in stale_jobs],
+                        deadline=scoring_deadline if n > 0 else None,
+                        memory=throttle
+                    )
+                
+                for j, analysis, ms in completed:
+                    i = stale[j]
+                    symbol_ms[jobs[i][0]] = round(ms, 3)
+                    if analysis:
+                        self.derived_cache.put(jobs[i][0], keys[i], analysis)
+                    cached[i] = analysis
+                if len(symbol_ms) < len(stale):
+                    print(f"  ⏱️  Scoring budget spent, {len(stale) - len(symbol_ms)} symbols left unscored")
+                    budget_hit = True
+                
+                rows = []
+                for i, analysis in enumerate(cached):
+                    symbol_ms.setdefault(jobs[i][0], 0.0)
+                    if analysis:
+                        rows.append(ranker.push(analysis, symbol_sectors.get(analysis['symbol'])))
+                        scored_symbols.add(analysis['symbol'])
+                        analyzed_count += 1
+                        
+                        # Progress update every 10 stocks
+                        if analyzed_count % 10 == 0:
+                            print(f"    ✓ Progress: {analyzed_count}/{total_stocks} stocks scored")
+                # Factors are extracted: let this batch's frames go
+                reused = len(jobs) - len(stale)
+                del cached, completed, jobs, stale_jobs
+                if not prefetched:
+                    price_data = {}
+                memory.end('score')
+                if memory.over_limit():
+                    print(f"  🧠 Over the {memory.limit_mb} MB limit, releasing cached prices and analyses")
+                    self.release_memory()
+                    memory.releases += 1
+                score_ms = elapsed_ms(stage_start)
+                score_total_ms += score_ms
+                metrics.observe('stage_seconds', score_ms / 1000, stage='run_score')
+                emit('sector_scored', sector=sector, rows=rows,
+                     scored=analyzed_count, total=total_stocks,
+                     cached=reused,
+                     timing={
+                         'download_ms': download_ms,
+                         'score_ms': score_ms,
+                         'symbol_ms': symbol_ms,
+                         'symbol_ms_amortized': engine in batch_scorers
+                     })
             
-            for symbol in stocks[:50]:  # Top 50 per sector
-                analysis = self.analyze_stock(symbol, spy_regime)
-                if analysis:
-                    all_analyses.append(analysis)
-                    analyzed_count += 1
-                    
-                    # Progress update every 10 stocks
-                    if analyzed_count % 10 == 0:
-                        print(f"    ✓ Progress: {analyzed_count}/{total_stocks} stocks analyzed")
+            # Phase 2: enrich only the finalists; anything else is enriched on demand
+            finalists = ranker.top()
+            print(f"\n🔬 Enriching top {len(finalists)} stocks (patterns, news, predictions)...")
+            emit('enriching', count=len(finalists))
+            enrich_start = time.perf_counter()
+            memory.begin('enrich')
+            enriched = [None] * len(finalists)
+            completed = self._run_ordered(
+                executor, self.enrich_analysis,
+                [(analysis,) for analysis in finalists],
+                [analysis['symbol'] for analysis in finalists],
+                deadline=deadline,
+                memory=throttle
+            )
+            finished = 0
+            for i, analysis, ms in completed:
+                enriched[i] = analysis
+                finished += 1
+                emit('symbol_enriched', symbol=finalists[i]['symbol'], ok=analysis is not None,
+                     elapsed_ms=round(ms, 2))
+            if finished < len(finalists):
+                print(f"  ⏱️  Time budget spent, {len(finalists) - finished} finalists left unenriched")
+                budget_hit = True
+            memory.end('enrich')
+            enrich_ms = elapsed_ms(enrich_start)
+            metrics.observe('stage_seconds', enrich_ms / 1000, stage='run_enrich')
+        finally:
+            memory.stop()
+            if executor is not None:
+                # Past the deadline, don't wait on enrichments still in flight
+                executor.shutdown(wait=not budget_hit, cancel_futures=True)
+        
+        self.metadata_cache.flush()
+        self.indicator_states.flush()
+        
+        top_opportunities = [a for a in enriched if a]
+        universe = {s for stocks in sector_stocks.values() for s in stocks[:50]}
+        coverage = {
+            'symbols_total': len(universe),
+            'symbols_attempted': len(attempted),
+            'symbols_scored': len(scored_symbols),
+            'scored_pct': round(100 * len(scored_symbols) / max(len(universe), 1), 1),
+            'finalists': len(finalists),
+            'enriched': len(top_opportunities),
+            'sectors': {
+                sector: {
+                    'scored': sum(s in scored_symbols for s in stocks[:50]),
+                    'total': len(stocks[:50])
+                }
+                for sector, stocks in sector_stocks.items()
+            },
+            'time_budget_s': time_budget,
+            'elapsed_s': round(time.perf_counter() - run_start, 3)
+        }
         
-        # Sort by score
-        all_analyses.sort(key=lambda x: x['score'], reverse=True)
+        total_ms = elapsed_ms(run_start)
+        metrics.observe('stage_seconds', total_ms / 1000, stage='run_total')
+        metrics.inc('runs_total', partial=str(budget_hit).lower())
+        timing = {
+            'total_ms': total_ms,
+            'regime_ms': regime_ms,
+            'download_ms': round(download_total_ms, 2),
+            'score_ms': round(score_total_ms, 2),
+            'enrich_ms': enrich_ms,
+            **metrics.summary_since(metrics_start)
+        }
         
-        print(f"\n✅ Analysis complete! Found {len(all_analyses)} valid stocks")
+        print(f"\n✅ Analysis {'stopped at the time budget' if budget_hit else 'complete'}! "
+              f"Found {len(ranker)} valid stocks")
+        emit('complete', total_analyzed=len(ranker), partial=budget_hit, coverage=coverage,
+             timing=timing)
         
-        return {
+        results = {
             'market_regime': spy_regime,
-            'total_analyzed': len(all_analyses),
-            'top_opportunities': all_analyses[:top_n],
-            'all_stocks': all_analyses,
+            'total_analyzed': len(ranker),
+            'top_opportunities': top_opportunities,
+            'all_stocks': ranker.summary(),
+            'partial': budget_hit,
+            'coverage': coverage,
+            'timing': timing,
+            'memory': memory.report(),
             'timestamp': datetime.now().isoformat()
         }
+        self.results_store.save(results)
+        
+        return results
+    
+    def _run_ordered(self, executor, fn, jobs: list, symbols: list, deadline: float = None,
+                     memory: MemoryMonitor = None):
+        """Yield (position, fn(*job), elapsed ms) as each job completes
+        
+        Runs serially when there is no executor. With a `deadline`
+        (a time.perf_counter() value) it stops yielding once that passes
+        and cancels whatever has not started. With `memory`, jobs are only
+        submitted as fast as `memory.allowed_workers` allows.
+        """
+        if executor is None:
+            for i, job in enumerate(jobs):
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                result, ms = self._timed(fn, *job)
+                yield i, result, ms
+            return
+        
+        if memory is not None:
+            yield from self._run_throttled(executor, fn, jobs, symbols, deadline, memory)
+            return
+        
+        futures = {executor.submit(self._timed, fn, *job): i for i, job in enumerate(jobs)}
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                i = futures[future]
+                result, ms = self._safe_result(future, symbols[i]) or (None, 0.0)
+                yield i, result, ms
+        except TimeoutError:
+            for future in futures:
+                future.cancel()
+    
+    def _run_throttled(self, executor, fn, jobs: list, symbols: list, deadline, memory: MemoryMonitor):
+        """_run_ordered with in-flight jobs capped by the memory monitor, re-checked per completion"""
+        workers = max(1, int(self.config.get('analysis_workers', 8)))
+        pending = {}
+        position = 0
+        while position < len(jobs) or pending:
+            if deadline is not None and time.perf_counter() >= deadline:
+                for future in pending:
+                    future.cancel()
+                return
+            
+            allowed = memory.allowed_workers(workers)
+            while position < len(jobs) and len(pending) < allowed:
+                pending[executor.submit(self._timed, fn, *jobs[position])] = position
+                position += 1
+            
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                result, ms = self._safe_result(future, symbols[i]) or (None, 0.0)
+                yield i, result, ms
+    
+    def priority_order(self, sector_stocks: dict) -> list:
+        """Symbols in the order a time-budgeted run scores them
+        
+        The last run's top opportunities come first, then the symbols with
+        stored prices by average dollar volume over their last 20 bars,
+        most liquid first. Symbols with no stored history follow, taken
+        round-robin across sectors in list order (the sector lists run
+        from the largest names down).
+        """
+        universe = []
+        for tier in zip_longest(*(stocks[:50] for stocks in sector_stocks.values())):
+            universe.extend(symbol for symbol in tier if symbol is not None)
+        universe = list(dict.fromkeys(universe))
+        
+        liquidity = {symbol: self.price_store.dollar_volume(symbol) for symbol in universe}
+        ranked = sorted((s for s in universe if liquidity[s] is not None), key=lambda s: -liquidity[s])
+        universe = ranked + [s for s in universe if liquidity[s] is None]
+        
+        previous = self.results_store.load()
+        leaders = []
+        if previous is not None:
+            members = set(universe)
+            leaders = [a['symbol'] for a in previous[2]['top_opportunities'] if a['symbol'] in members]
+        
+        return list(dict.fromkeys(leaders + universe))
+    
+    @staticmethod
+    def _symbols_that_fit(deadline: float, done: int, spent_ms: float) -> int:
+        """How many more symbols fit before `deadline` at the average cost so far"""
+        left_ms = (deadline - time.perf_counter()) * 1000
+        if left_ms <= 0:
+            return 0
+        if not done or spent_ms <= 0:
+            return sys.maxsize
+        return int(left_ms / (spent_ms / done))
+    
+    @staticmethod
+    def _timed(fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, (time.perf_counter() - start) * 1000
+    
+    @staticmethod
+    def _safe_result(future, symbol: str):
+        """Unwrap a worker result, keeping one symbol's failure isolated"""
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Error analyzing {symbol}: {e}")
+            metrics.error('worker')
+            return None
+    
+    def warmup(self, enabled_sectors=None, top_n=None, progress_callback=None) -> dict:
+        """Run the configured analysis and pre-load every cache it touches
+        
+        run_analysis fills the price store and indicator state, enriches the
+        top stocks (news and company info) and stores the results; company
+        info is then fetched for every other scored stock as well.
+        """
+        if enabled_sectors is None:
+            enabled_sectors = self.config.get('enabled_sectors')
+        if top_n is None:
+            top_n = self.config.get('top_opportunities', 20)
+        
+        results = self.run_analysis(enabled_sectors, top_n, progress_callback)
+        
+        symbols = [row['symbol'] for row in results['all_stocks']]
+        workers = max(1, self.config.get('analysis_workers', 8))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(self.metadata_cache.get, symbols))
+        self.metadata_cache.flush()
+        
+        print(f"🔥 Warmup complete: {len(symbols)} stocks cached")
+        return results
     
     def format_recommendation(self, analysis: dict, capital: float) -> dict:
         """Format a trading recommendation with position sizing"""
@@ -787,10 +3482,165 @@ class LiveTradingAnalyzer:
             'regime': analysis['regime']
         }
 
+# ============================================================================
+# WARMUP SCHEDULER (Cron-style pre-market runs)
+# ============================================================================
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day-of-month month day-of-week
+    
+    Supports *, lists (1,15), ranges (1-5) and steps (*/10, 0-30/5).
+    Day of week is 0-6 from Sunday (7 is also Sunday). As in cron, when
+    both day fields are restricted a time matching either one fires.
+    """
+    
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.BOUNDS)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+    
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(','):
+            spec, _, step = part.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(v) for v in spec.split('-'))
+            else:
+                start = end = int(spec)
+                if step:
+                    end = high
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field out of range: {field!r}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+    
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+    
+    def next_after(self, dt: datetime) -> datetime:
+        """First matching minute strictly after dt (keeps dt's tzinfo)
+        
+        A wall-clock time skipped by a daylight-saving jump fires at the
+        same instant after the jump (02:30 becomes 03:30 in the spring),
+        as cron does, instead of a time that never exists.
+        """
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            elif dt.tzinfo is not None:
+                # Round trip through a timestamp to land on a real local time
+                return datetime.fromtimestamp(dt.timestamp(), dt.tzinfo)
+            else:
+                return dt
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+class WarmupScheduler:
+    """Call `run` at every time matched by a cron schedule, on a daemon thread
+    
+    `timezone` (e.g. 'America/New_York') is the zone the schedule is read
+    in; by default the server's local time. With `lock_path`, only the
+    first process to take an exclusive lock on that file schedules runs,
+    so several web workers do not each start a warmup.
+    """
+    
+    def __init__(self, schedule: str, run, timezone: str = None, lock_path: str = None):
+        self.schedule = CronSchedule(schedule)
+        self.run = run
+        self.tz = ZoneInfo(timezone) if timezone else None
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._thread = None
+    
+    def next_run(self, now: datetime = None) -> datetime:
+        now = now or datetime.now(self.tz)
+        return self.schedule.next_after(now)
+    
+    def start(self) -> bool:
+        """Start the scheduling thread; False if another process holds the lock"""
+        if self.lock_path and not self._acquire_lock():
+            return False
+        self._thread = threading.Thread(target=self.run_forever, daemon=True)
+        self._thread.start()
+        return True
+    
+    def _acquire_lock(self) -> bool:
+        try:
+            import fcntl
+        except ImportError:  # Not POSIX: no cross-process guard
+            return True
+        
+        self._lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+    
+    def run_forever(self):
+        while True:
+            due = self.next_run()
+            print(f"⏰ Next warmup at {due.isoformat()}")
+            while (wait := due.timestamp() - time.time()) > 0:
+                time.sleep(min(wait, 60))
+            
+            try:
+                self.run()
+            except Exception as e:
+                print(f"❌ Scheduled warmup failed: {e}")
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
+# Which part of the pipeline each setting feeds; a change only invalidates
+# its own stage (and the stages that consume it at run time). Settings read
+# per run, like enabled_sectors, belong to no stage.
+CONFIG_STAGES = {
+    'data': ('data_provider', 'data_dir', 'data_format'),
+    'universe': ('download_scope', 'download_batch_size', 'price_cache_dir',
+                 'memory_limit_mb', 'memory_chunk_size', 'memory_trace_allocations'),
+    'scoring': ('factor_engine', 'process_workers', 'analysis_workers', 'top_opportunities',
+                'min_score', 'analysis_time_budget_s'),
+    'enrichment': ('metadata_cache_file', 'metadata_ttl_days', 'news_ttl_minutes'),
+    'sizing': ('capital', 'position_size_pct', 'stop_loss_pct', 'take_profit_pct')
+}
+
+def changed_config_stages(old: dict, new: dict) -> set:
+    """Stages with at least one setting that differs between two configs"""
+    return {
+        stage for stage, keys in CONFIG_STAGES.items()
+        if any(old.get(key) != new.get(key) for key in keys)
+    }
+
 def load_config():
     """Load or create default configuration"""
     
@@ -801,7 +3651,27 @@ def load_config():
         'take_profit_pct': 10,
         'enabled_sectors': list(SECTORS.keys()),
         'top_opportunities': 20,
-        'min_score': 50
+        'min_score': 50,
+        'download_scope': 'sector',
+        'download_batch_size': 100,
+        'price_cache_dir': 'price_cache',
+        'analysis_workers': 8,
+        'metadata_cache_file': 'metadata_cache.json',
+        'metadata_ttl_days': 30,
+        'factor_engine': 'panel',
+        'process_workers': 0,
+        'max_streams': 8,
+        'results_store_file': 'results.db',
+        'news_ttl_minutes': 30,
+        'warmup_schedule': '',
+        'warmup_timezone': 'America/New_York',
+        'analysis_time_budget_s': 0,
+        'data_provider': 'yahoo',
+        'data_dir': 'market_data',
+        'data_format': 'csv',
+        'memory_limit_mb': 0,
+        'memory_chunk_size': 25,
+        'memory_trace_allocations': False
     }
     
     config_file = 'trading_config.json'
@@ -829,6 +3699,23 @@ def save_config(config):
 # ============================================================================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Live trading analysis')
+    parser.add_argument(
+        '--schedule', nargs='?', const='', metavar='CRON',
+        help='Keep running and warm the caches on a cron schedule '
+             '(default: warmup_schedule from trading_config.json)'
+    )
+    parser.add_argument(
+        '--provider', choices=['yahoo', 'local', 'record', 'replay'],
+        help='Data source for this run (default: data_provider from trading_config.json)'
+    )
+    parser.add_argument('--data-dir', help='Directory for the local/record/replay providers')
+    parser.add_argument(
+        '--profile', nargs='?', const='', metavar='PREFIX',
+        help='Sample the run and write PREFIX.json/.collapsed/.pstats (default: profile_<timestamp>)'
+    )
+    args = parser.parse_args()
+    
     print("""
 ╔══════════════════════════════════════════════════════════════════════════════╗
 ║                    LIVE TRADING ANALYSIS SYSTEM                              ║
@@ -846,14 +3733,36 @@ if __name__ == "__main__":
     """)
     
     config = load_config()
+    if args.provider:
+        config['data_provider'] = args.provider
+    if args.data_dir:
+        config['data_dir'] = args.data_dir
     analyzer = LiveTradingAnalyzer(config)
     
+    if args.schedule is not None:
+        schedule = args.schedule or config.get('warmup_schedule')
+        if not schedule:
+            parser.error('no CRON given and warmup_schedule is not set')
+        timezone = config.get('warmup_timezone')
+        print(f"⏰ Warmup schedule: {schedule} ({timezone or 'local time'})")
+        WarmupScheduler(schedule, analyzer.warmup, timezone=timezone).run_forever()
+    
     print(f"💰 Capital: ${config['capital']}")
     print(f"📊 Position Size: {config['position_size_pct']}% (${config['capital'] * config['position_size_pct'] / 100:.0f} per trade)")
     print(f"🎯 Sectors Enabled: {len(config['enabled_sectors'])}")
     print(f"\nStarting analysis...\n")
     
-    results = analyzer.run_analysis(config['enabled_sectors'], config['top_opportunities'])
+    if args.profile is not None:
+        with SamplingProfiler() as profiler:
+            results = analyzer.run_analysis(config['enabled_sectors'], config['top_opportunities'])
+        summary = profiler.summary(top=10)
+        print(f"\n🔬 Profile: {summary['samples']} samples over {summary['duration_s']}s")
+        for stage, entry in list(summary['stages'].items())[:8]:
+            print(f"   {stage:<20} {entry['ms']:>10.1f} ms  {entry['pct']:5.1f}%")
+        prefix = args.profile or f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        print(f"   Saved {', '.join(profiler.save(prefix))}")
+    else:
+        results = analyzer.run_analysis(config['enabled_sectors'], config['top_opportunities'])
     
     print(f"\n{'='*80}")
     print(f"📈 TOP {len(results['top_opportunities'])} OPPORTUNITIES")